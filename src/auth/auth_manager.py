@@ -11,24 +11,31 @@ from datetime import datetime, timedelta
 
 from ..config.settings import AppConfig
 from ..config.constants import DEFAULT_USERS
+from ..utils.file_lock import FileLock, write_json_atomic
 
 
 class AuthManager:
-    """用户认证管理器"""
+    """用户认证管理器
+    
+    多个服务进程共享同一个用户文件：读取时持有共享锁，读-改-写时持有排他锁，
+    写入先写临时文件再原子替换。
+    """
     
     def __init__(self):
         self.users_file = AppConfig.USERS_FILE
         self.max_login_attempts = AppConfig.MAX_LOGIN_ATTEMPTS
         self.lockout_time = AppConfig.LOCKOUT_TIME
         self.login_attempts = {}  # 登录尝试记录
+        self._lock = FileLock(f"{self.users_file}.lock")
         self.init_users()
     
     def init_users(self):
         """初始化用户文件"""
-        if not os.path.exists(self.users_file):
-            with open(self.users_file, "w", encoding='utf-8') as f:
-                json.dump(DEFAULT_USERS, f, ensure_ascii=False, indent=2)
-            logging.info("Created default users file")
+        with self._lock.exclusive():
+            if os.path.exists(self.users_file):
+                return
+            write_json_atomic(self.users_file, DEFAULT_USERS)
+        logging.info("Created default users file")
     
     @staticmethod
     def hash_password(password: str) -> str:
@@ -42,8 +49,8 @@ class AuthManager:
             return False
         
         try:
-            with open(self.users_file, "r", encoding='utf-8') as f:
-                users = json.load(f)
+            with self._lock.shared():
+                users = self._read_users()
             
             is_valid = username in users and users[username] == self.hash_password(password)
             
@@ -69,16 +76,14 @@ class AuthManager:
             if not self._validate_credentials(username, password):
                 return False, "用户名或密码不符合要求"
             
-            with open(self.users_file, "r", encoding='utf-8') as f:
-                users = json.load(f)
-            
-            if username in users:
-                return False, "用户名已存在"
-            
-            users[username] = self.hash_password(password)
-            
-            with open(self.users_file, "w", encoding='utf-8') as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
+            with self._lock.exclusive():
+                users = self._read_users()
+                
+                if username in users:
+                    return False, "用户名已存在"
+                
+                users[username] = self.hash_password(password)
+                write_json_atomic(self.users_file, users)
             
             logging.info(f"New user {username} registered")
             return True, "注册成功"
@@ -98,13 +103,10 @@ class AuthManager:
             if not self._validate_password(new_password):
                 return False, "新密码不符合要求"
             
-            with open(self.users_file, "r", encoding='utf-8') as f:
-                users = json.load(f)
-            
-            users[username] = self.hash_password(new_password)
-            
-            with open(self.users_file, "w", encoding='utf-8') as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
+            with self._lock.exclusive():
+                users = self._read_users()
+                users[username] = self.hash_password(new_password)
+                write_json_atomic(self.users_file, users)
             
             logging.info(f"Password changed for user {username}")
             return True, "密码修改成功"
@@ -120,16 +122,14 @@ class AuthManager:
             if username == "admin":
                 return False, "不能删除管理员用户"
             
-            with open(self.users_file, "r", encoding='utf-8') as f:
-                users = json.load(f)
-            
-            if username not in users:
-                return False, "用户不存在"
-            
-            del users[username]
-            
-            with open(self.users_file, "w", encoding='utf-8') as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
+            with self._lock.exclusive():
+                users = self._read_users()
+                
+                if username not in users:
+                    return False, "用户不存在"
+                
+                del users[username]
+                write_json_atomic(self.users_file, users)
             
             logging.info(f"User {username} deleted")
             return True, "用户删除成功"
@@ -141,13 +141,18 @@ class AuthManager:
     def list_users(self) -> list:
         """获取用户列表"""
         try:
-            with open(self.users_file, "r", encoding='utf-8') as f:
-                users = json.load(f)
+            with self._lock.shared():
+                users = self._read_users()
             return list(users.keys())
         except Exception as e:
             logging.error(f"Error listing users: {str(e)}")
             return []
     
+    def _read_users(self) -> Dict[str, str]:
+        """读取用户文件（调用方持有锁）"""
+        with open(self.users_file, "r", encoding='utf-8') as f:
+            return json.load(f)
+    
     def _validate_credentials(self, username: str, password: str) -> bool:
         """验证用户名和密码格式"""
         # 用户名要求：3-20个字符，只能包含字母、数字、下划线
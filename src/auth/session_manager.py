@@ -10,21 +10,27 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, Any
 
 from ..config.settings import AppConfig
+from ..utils.file_lock import FileLock, VersionConflictError, write_json_atomic
 
 
 class SessionManager:
-    """会话管理器"""
+    """会话管理器
+    
+    多个服务进程共享同一个会话文件：读取时持有共享锁，读-改-写时持有排他锁，
+    写入先写临时文件再原子替换。
+    """
     
     def __init__(self):
         self.session_file = "sessions.json"
         self.session_timeout = 3600  # 会话超时时间（秒）
+        self._lock = FileLock(f"{self.session_file}.lock")
         self.init_sessions()
     
     def init_sessions(self):
         """初始化会话文件"""
-        if not os.path.exists(self.session_file):
-            with open(self.session_file, "w", encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
+        with self._lock.exclusive():
+            if not os.path.exists(self.session_file):
+                write_json_atomic(self.session_file, {})
     
     def create_session(self, username: str, user_data: Optional[Dict] = None) -> str:
         """创建新会话"""
@@ -42,10 +48,14 @@ class SessionManager:
         return ""
     
     def validate_session(self, session_id: str) -> Optional[Dict]:
-        """验证会话有效性"""
+        """验证会话有效性
+        
+        每个请求都会验证会话，因此只在共享锁下读取；更新活动时间时检查读取后会话文件是否被修改，
+        被修改时在排他锁下重新读取再更新，不覆盖其他进程的写入。
+        """
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
+            with self._lock.shared() as version:
+                sessions = self._read_sessions()
             
             if session_id not in sessions:
                 return None
@@ -62,8 +72,12 @@ class SessionManager:
             session_data["last_activity"] = datetime.now().isoformat()
             sessions[session_id] = session_data
             
-            with open(self.session_file, "w", encoding='utf-8') as f:
-                json.dump(sessions, f, ensure_ascii=False, indent=2)
+            try:
+                with self._lock.exclusive(expected_version=version):
+                    write_json_atomic(self.session_file, sessions)
+            except VersionConflictError:
+                if not self.update_session(session_id, {}):
+                    return None
             
             return session_data
             
@@ -74,17 +88,15 @@ class SessionManager:
     def update_session(self, session_id: str, data: Dict) -> bool:
         """更新会话数据"""
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            if session_id not in sessions:
-                return False
-            
-            sessions[session_id]["user_data"].update(data)
-            sessions[session_id]["last_activity"] = datetime.now().isoformat()
-            
-            with open(self.session_file, "w", encoding='utf-8') as f:
-                json.dump(sessions, f, ensure_ascii=False, indent=2)
+            with self._lock.exclusive():
+                sessions = self._read_sessions()
+                
+                if session_id not in sessions:
+                    return False
+                
+                sessions[session_id]["user_data"].update(data)
+                sessions[session_id]["last_activity"] = datetime.now().isoformat()
+                write_json_atomic(self.session_file, sessions)
             
             return True
             
@@ -95,20 +107,17 @@ class SessionManager:
     def destroy_session(self, session_id: str) -> bool:
         """销毁会话"""
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            if session_id in sessions:
+            with self._lock.exclusive():
+                sessions = self._read_sessions()
+                if session_id not in sessions:
+                    return False
+                
                 username = sessions[session_id].get("username", "unknown")
                 del sessions[session_id]
-                
-                with open(self.session_file, "w", encoding='utf-8') as f:
-                    json.dump(sessions, f, ensure_ascii=False, indent=2)
-                
-                logging.info(f"Session destroyed for user {username}")
-                return True
+                write_json_atomic(self.session_file, sessions)
             
-            return False
+            logging.info(f"Session destroyed for user {username}")
+            return True
             
         except Exception as e:
             logging.error(f"Error destroying session {session_id}: {str(e)}")
@@ -117,24 +126,24 @@ class SessionManager:
     def cleanup_expired_sessions(self):
         """清理过期会话"""
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            current_time = datetime.now()
-            expired_sessions = []
-            
-            for session_id, session_data in sessions.items():
-                last_activity = datetime.fromisoformat(session_data["last_activity"])
-                if current_time - last_activity > timedelta(seconds=self.session_timeout):
-                    expired_sessions.append(session_id)
-            
-            for session_id in expired_sessions:
-                del sessions[session_id]
+            with self._lock.exclusive():
+                sessions = self._read_sessions()
+                
+                current_time = datetime.now()
+                expired_sessions = []
+                
+                for session_id, session_data in sessions.items():
+                    last_activity = datetime.fromisoformat(session_data["last_activity"])
+                    if current_time - last_activity > timedelta(seconds=self.session_timeout):
+                        expired_sessions.append(session_id)
+                
+                for session_id in expired_sessions:
+                    del sessions[session_id]
+                
+                if expired_sessions:
+                    write_json_atomic(self.session_file, sessions)
             
             if expired_sessions:
-                with open(self.session_file, "w", encoding='utf-8') as f:
-                    json.dump(sessions, f, ensure_ascii=False, indent=2)
-                
                 logging.info(f"Cleaned up {len(expired_sessions)} expired sessions")
             
         except Exception as e:
@@ -143,17 +152,12 @@ class SessionManager:
     def get_active_sessions(self) -> Dict[str, Dict]:
         """获取所有活跃会话"""
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
             # 清理过期会话
             self.cleanup_expired_sessions()
             
             # 重新读取清理后的会话
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            return sessions
+            with self._lock.shared():
+                return self._read_sessions()
             
         except Exception as e:
             logging.error(f"Error getting active sessions: {str(e)}")
@@ -166,16 +170,18 @@ class SessionManager:
     def _save_session(self, session_id: str, session_data: Dict) -> bool:
         """保存会话数据"""
         try:
-            with open(self.session_file, "r", encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            sessions[session_id] = session_data
-            
-            with open(self.session_file, "w", encoding='utf-8') as f:
-                json.dump(sessions, f, ensure_ascii=False, indent=2)
+            with self._lock.exclusive():
+                sessions = self._read_sessions()
+                sessions[session_id] = session_data
+                write_json_atomic(self.session_file, sessions)
             
             return True
             
         except Exception as e:
             logging.error(f"Error saving session {session_id}: {str(e)}")
             return False
+    
+    def _read_sessions(self) -> Dict[str, Dict]:
+        """读取会话文件（调用方持有锁）"""
+        with open(self.session_file, "r", encoding='utf-8') as f:
+            return json.load(f)
@@ -57,6 +57,36 @@ class DatabaseConfig:
     USE_JSON_STORAGE = os.getenv("USE_JSON_STORAGE", "True").lower() == "true"
     DATA_DIR = "data"
     
+    # SQLite连接配置
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # 每个连接的页缓存
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 内存映射读取上限（字节）
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # 毫秒
+    
+    # 各数据表的二级索引列，写入时维护，按这些列过滤的查询只读取匹配的记录
+    TABLE_INDEXES = {
+        'usage_data': ['space', 'date'],
+        'environment_data': ['space', 'timestamp'],
+        'learning_behavior_data': ['user_id', 'space'],
+        'performance_data': ['user_id', 'date'],
+        'resource_usage_data': ['resource', 'timestamp']
+    }
+    # JSON表的追加写入先记入WAL，WAL超过该大小（字节）时在后台合并进主文件
+    JSON_WAL_COMPACT_BYTES = int(os.getenv("JSON_WAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+    FSYNC_WRITES = os.getenv("FSYNC_WRITES", "False").lower() == "true"  # 写入后是否fsync到磁盘
+    
+    # 时间序列表的分区列和分区粒度（day/month），用于 save_partitioned 和 query_range
+    TABLE_PARTITIONS = {
+        'usage_data': {'column': 'date', 'granularity': 'day'},
+        'environment_data': {'column': 'timestamp', 'granularity': 'day'},
+        'resource_usage_data': {'column': 'timestamp', 'granularity': 'day'}
+    }
+    # 同一过滤列组合的查询达到该次数时自动为其建索引，0 表示只给出建议不自动创建
+    SQLITE_AUTO_INDEX_THRESHOLD = int(os.getenv("SQLITE_AUTO_INDEX_THRESHOLD", "0"))
+    
+    # 备份快照的压缩方式（zstd/gzip/none），未安装zstandard时zstd退化为gzip
+    BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "zstd")
+    BACKUP_COMPRESSION_LEVEL = int(os.getenv("BACKUP_COMPRESSION_LEVEL", "3"))
+
 
 class AIConfig:
     """AI服务配置"""
@@ -84,6 +114,7 @@ class CacheConfig:
     
     CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # 秒
     MAX_CACHE_SIZE = int(os.getenv("MAX_CACHE_SIZE", "1000"))
+    TABLE_CACHE_MAX_BYTES = int(os.getenv("TABLE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 数据表缓存上限，0为关闭
     
     # Redis配置（如果使用）
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -96,6 +127,8 @@ class PerformanceConfig:
     # 数据处理配置
     BATCH_SIZE = int(os.getenv("BATCH_SIZE", "10"))
     MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+    SIMULATOR_CHUNK_SIZE = int(os.getenv("SIMULATOR_CHUNK_SIZE", "50000"))  # 流式生成每块行数
+    STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", "50000"))  # 分块读取数据表每块行数
     
     # 限流配置
     RATE_LIMIT = int(os.getenv("RATE_LIMIT", "100"))
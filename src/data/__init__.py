@@ -4,5 +4,8 @@ from .data_simulator import AdvancedDataSimulator
 from .learning_space_model import LearningSpaceModel
 from .analytics import DataAnalyzer, LearningAnalytics
 from .storage import DataStorage
+from .event_stream import SensorEventStream
+from .replay import ScenarioReplayer
 
-__all__ = ['AdvancedDataSimulator', 'LearningSpaceModel', 'DataAnalyzer', 'LearningAnalytics', 'DataStorage']
+__all__ = ['AdvancedDataSimulator', 'LearningSpaceModel', 'DataAnalyzer', 'LearningAnalytics', 'DataStorage', 'SensorEventStream',
+           'ScenarioReplayer']
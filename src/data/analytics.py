@@ -74,6 +74,33 @@ class DataAnalyzer:
             self.logger.error(f"Error analyzing space usage: {str(e)}")
             return {"error": str(e)}
     
+    def analyze_hourly_usage(self, storage: Any, table_name: str = "usage_data", filters: Optional[Dict] = None,
+                             file_format: str = "json") -> Dict[str, Any]:
+        """按小时统计平均使用率，聚合在存储后端完成，不加载整张表
+        
+        Args:
+            storage: DataStorage 实例
+            table_name: 空间使用数据表名
+            filters: 过滤条件，如 {'space': '图书馆'}
+            file_format: 文件格式（仅文件模式）
+        """
+        try:
+            hourly = storage.aggregate(table_name, 'hour', {'usage_rate': 'mean'}, filters=filters,
+                                       file_format=file_format)
+            if hourly is None or hourly.empty:
+                return {"error": f"No usage data in {table_name}"}
+            
+            hourly_pattern = hourly.set_index('hour')['usage_rate_mean']
+            return {
+                'peak_hours': hourly_pattern.nlargest(3).index.tolist(),
+                'low_hours': hourly_pattern.nsmallest(3).index.tolist(),
+                'pattern_data': hourly_pattern.to_dict()
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error analyzing hourly usage: {str(e)}")
+            return {"error": str(e)}
+    
     def analyze_learning_behavior(self, behavior_data: pd.DataFrame) -> Dict[str, Any]:
         """分析学习行为"""
         try:
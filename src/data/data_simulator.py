@@ -2,19 +2,59 @@
 数据模拟器
 """
 
-import random
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Iterable, Callable
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from .schema import apply_schema, get_table_name
+from ..config.settings import PerformanceConfig
 
 
 class DataSimulator:
     """数据模拟器"""
     
-    def __init__(self):
+    # 各类数据的随机流编号，作为 SeedSequence spawn_key 的第一项
+    STREAM_IDS = {
+        'default': 0,
+        'usage': 1,
+        'environment': 2,
+        'learning_behavior': 3,
+        'performance': 4,
+        'resource_usage': 5,
+        'user_profiles': 6,
+        'space_catalog': 7
+    }
+    
+    # 用户分区大小：随机流按固定大小的用户分区派生，与分块大小和进程数无关
+    USER_PARTITION_SIZE = 256
+    
+    # 规模档案：校区数量、每个校区的房间数量，以及建议的模拟用户数（用户类生成方法的默认用户数）
+    SCALE_PROFILES = {
+        'small': {'campuses': 1, 'rooms_per_campus': 20, 'users': 500},
+        'medium': {'campuses': 2, 'rooms_per_campus': 100, 'users': 5000},
+        'large': {'campuses': 4, 'rooms_per_campus': 250, 'users': 20000},
+        'xlarge': {'campuses': 8, 'rooms_per_campus': 500, 'users': 50000}
+    }
+    
+    # 噪音等级对应的基础噪音（分贝）
+    NOISE_LEVEL_DB = {'very_low': 25, 'low': 30, 'medium': 42, 'high': 55}
+    
+    def __init__(self, seed: Optional[int] = None, reference_date: Optional[datetime] = None,
+                 scale: Optional[str] = None):
+        """
+        Args:
+            seed: 随机种子，相同种子生成逐位相同的数据；为None时使用系统熵
+            reference_date: 数据截止时间，为None时使用当前时间
+            scale: 规模档案名称（small/medium/large/xlarge），为None时使用默认的五个物理空间
+        """
         self.logger = logging.getLogger(__name__)
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.reference_date = reference_date
+        self.rng = self._partition_rng('default')
+        self._hour_factors: Optional[np.ndarray] = None
         
         # 空间类型配置
         self.space_types = {
@@ -37,6 +77,29 @@ class DataSimulator:
             }
         }
         
+        # 基础物理空间类型（规模档案以此为模板合成空间目录）
+        self._base_space_types = dict(self.space_types['physical'])
+        self.scale: Optional[str] = None
+        self.scale_users: Optional[int] = None  # 规模档案建议的模拟用户数，作为用户类生成方法的默认用户数
+        
+        # 空间环境档案：基础温度、湿度、CO2浓度与噪音（未配置的空间使用默认档案）
+        self.default_environment_profile = {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 35}
+        self.environment_profiles = {
+            '图书馆': {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 30},
+            '自习室': {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 25},
+            '实验室': {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 45},
+            '教室': {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 40},
+            '咖啡厅': {'temperature': 22, 'humidity': 45, 'co2': 400, 'noise': 55}
+        }
+        
+        # 资源类型
+        self.resources = ['计算机', '图书', '实验设备', '投影仪', '网络', '打印机']
+        
+        # 学习活动与用户属性
+        self.activity_types = ['阅读', '编程', '写作', '研究', '讨论']
+        self.skill_levels = ['初级', '中级', '高级']
+        self.learning_styles = ['视觉型', '听觉型', '动手型', '阅读型']
+        
         # 用户行为模式
         self.behavior_patterns = {
             '早鸟型': {'peak_hours': [7, 8, 9, 10], 'prefer_quiet': True},
@@ -44,164 +107,531 @@ class DataSimulator:
             '社交型': {'peak_hours': [14, 15, 16, 17], 'prefer_quiet': False},
             '专注型': {'peak_hours': [9, 10, 14, 15], 'prefer_quiet': True}
         }
+        
+        if scale is not None:
+            self.apply_scale_profile(scale)
+    
+    def apply_scale_profile(self, scale: str) -> Dict[str, Dict[str, Any]]:
+        """按规模档案合成多校区空间目录，替换当前的物理空间配置
+        
+        每个房间随机继承一种基础空间类型的噪音等级和资源，容量在基础容量附近浮动，
+        空间名称形如 "校区1-图书馆-001"。返回合成的物理空间目录。
+        """
+        if scale not in self.SCALE_PROFILES:
+            raise ValueError(f"Unknown scale profile: {scale}")
+        
+        profile = self.SCALE_PROFILES[scale]
+        base_types = self._base_space_types
+        base_names = list(base_types.keys())
+        rng = self._partition_rng('space_catalog')
+        n_rooms = profile['campuses'] * profile['rooms_per_campus']
+        
+        # 向量化抽取房间类型、容量和环境档案偏移
+        room_type = rng.integers(len(base_names), size=n_rooms)
+        base_capacity = np.array([base_types[name]['capacity'] for name in base_names])[room_type]
+        capacity = np.maximum(5, np.round(base_capacity * rng.lognormal(0, 0.3, size=n_rooms))).astype(np.int64)
+        temperature = 22 + rng.normal(0, 0.5, size=n_rooms)
+        humidity = 45 + rng.normal(0, 2, size=n_rooms)
+        base_noise = np.array([
+            self.NOISE_LEVEL_DB[base_types[name]['noise_level']] for name in base_names
+        ])[room_type] + rng.normal(0, 2, size=n_rooms)
+        
+        catalog = {}
+        environment_profiles = {}
+        type_counts: Dict[tuple, int] = {}
+        for i in range(n_rooms):
+            campus = i // profile['rooms_per_campus'] + 1
+            type_name = base_names[room_type[i]]
+            type_counts[(campus, type_name)] = type_counts.get((campus, type_name), 0) + 1
+            name = f"校区{campus}-{type_name}-{type_counts[(campus, type_name)]:03d}"
+            
+            catalog[name] = {
+                'capacity': int(capacity[i]),
+                'noise_level': base_types[type_name]['noise_level'],
+                'resources': list(base_types[type_name]['resources']),
+                'campus': f"校区{campus}",
+                'space_type': type_name
+            }
+            environment_profiles[name] = {
+                'temperature': float(temperature[i]),
+                'humidity': float(humidity[i]),
+                'co2': 400,
+                'noise': float(base_noise[i])
+            }
+        
+        self.space_types['physical'] = catalog
+        self.environment_profiles = environment_profiles
+        self.scale = scale
+        self.scale_users = profile['users']
+        return catalog
     
     def generate_usage_data(self, days: int = 30, spaces: Optional[List[str]] = None) -> pd.DataFrame:
-        """生成空间使用数据"""
+        """生成空间使用数据（向量化实现）"""
         if spaces is None:
             spaces = list(self.space_types['physical'].keys())
         
-        data = []
-        start_date = datetime.now() - timedelta(days=days)
+        start_date = self._get_start_date(days)
+        return self._generate_usage_block(start_date, 0, days, spaces)
+    
+    def generate_environment_data(self, days: int = 30, spaces: Optional[List[str]] = None,
+                                  interval_minutes: int = 60) -> pd.DataFrame:
+        """生成环境数据
         
-        for day in range(days):
-            current_date = start_date + timedelta(days=day)
-            
-            for space in spaces:
-                # 工作日和周末的使用模式不同
-                is_weekend = current_date.weekday() >= 5
-                base_usage = 0.6 if is_weekend else 0.8
-                
-                for hour in range(24):
-                    # 根据时间段调整使用率
-                    hour_factor = self._get_hour_factor(hour, is_weekend)
-                    usage_rate = base_usage * hour_factor * random.uniform(0.7, 1.3)
-                    usage_rate = max(0, min(1, usage_rate))  # 限制在0-1之间
-                    
-                    capacity = self.space_types['physical'].get(space, {}).get('capacity', 50)
-                    actual_users = int(capacity * usage_rate)
-                    
-                    data.append({
-                        'date': current_date.date(),
-                        'hour': hour,
-                        'space': space,
-                        'users': actual_users,
-                        'capacity': capacity,
-                        'usage_rate': usage_rate,
-                        'is_weekend': is_weekend
-                    })
-        
-        return pd.DataFrame(data)
-    
-    def generate_environment_data(self, days: int = 30) -> pd.DataFrame:
-        """生成环境数据"""
-        data = []
-        start_date = datetime.now() - timedelta(days=days)
-        
-        spaces = list(self.space_types['physical'].keys())
-        
-        for day in range(days):
-            current_date = start_date + timedelta(days=day)
-            
-            for space in spaces:
-                # 每小时生成一次环境数据
-                for hour in range(24):
-                    timestamp = current_date.replace(hour=hour, minute=0, second=0)
-                    
-                    # 根据空间类型生成基础环境参数
-                    base_temp = 22 + random.gauss(0, 2)
-                    base_humidity = 45 + random.gauss(0, 5)
-                    base_co2 = 400 + random.gauss(0, 50)
-                    
-                    # 根据使用率调整环境参数
-                    usage_factor = self._get_hour_factor(hour, current_date.weekday() >= 5)
-                    
-                    data.append({
-                        'timestamp': timestamp,
-                        'space': space,
-                        'temperature': base_temp + usage_factor * random.uniform(-1, 3),
-                        'humidity': base_humidity + usage_factor * random.uniform(-5, 10),
-                        'co2': base_co2 + usage_factor * random.uniform(0, 200),
-                        'noise_level': self._get_noise_level(space, usage_factor),
-                        'light_level': self._get_light_level(hour, usage_factor)
-                    })
-        
-        return pd.DataFrame(data)
-    
-    def generate_learning_behavior_data(self, users: int = 100, days: int = 30) -> pd.DataFrame:
+        Args:
+            days: 天数
+            spaces: 空间列表，默认为全部物理空间
+            interval_minutes: 采样间隔（分钟），默认每小时一次
+        """
+        if spaces is None:
+            spaces = list(self.space_types['physical'].keys())
+        
+        start_date = self._get_start_date(days)
+        return self._generate_environment_block(start_date, 0, days, spaces, interval_minutes)
+    
+    def generate_learning_behavior_data(self, users: Optional[int] = None, days: int = 30) -> pd.DataFrame:
         """生成学习行为数据"""
-        data = []
-        start_date = datetime.now() - timedelta(days=days)
+        users = self._default_users(users)
+        start_date = self._get_start_date(days)
+        return self._generate_learning_behavior_block(start_date, 0, days, users)
+    
+    def generate_learning_behavior_data_parallel(self, users: Optional[int] = None, days: int = 30,
+                                                 max_workers: Optional[int] = None) -> pd.DataFrame:
+        """使用进程池按用户分区并行生成学习行为数据
         
-        # 生成用户档案
-        users_profiles = self._generate_user_profiles(users)
+        各分区使用独立随机流，合并后的结果与 generate_learning_behavior_data 逐位相同。
+        """
+        users = self._default_users(users)
+        start_date = self._get_start_date(days)
+        partitions = range(self._user_partition_count(users))
+        max_workers = max_workers or PerformanceConfig.MAX_WORKERS
         
-        for day in range(days):
-            current_date = start_date + timedelta(days=day)
-            is_weekend = current_date.weekday() >= 5
-            
-            for user_id, profile in users_profiles.items():
-                # 根据用户类型决定是否学习
-                learning_probability = 0.3 if is_weekend else 0.8
-                if random.random() > learning_probability:
-                    continue
-                
-                # 生成学习会话
-                sessions = self._generate_learning_sessions(user_id, profile, current_date)
-                data.extend(sessions)
-        
-        return pd.DataFrame(data)
-    
-    def generate_performance_data(self, users: int = 100, days: int = 30) -> pd.DataFrame:
-        """生成学习表现数据"""
-        data = []
-        start_date = datetime.now() - timedelta(days=days)
+        if max_workers <= 1 or len(partitions) <= 1:
+            frames = [self._generate_behavior_partition(start_date, days, partition, users) for partition in partitions]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                frames = list(executor.map(
+                    self._generate_behavior_partition,
+                    [start_date] * len(partitions), [days] * len(partitions), partitions, [users] * len(partitions),
+                    chunksize=max(1, len(partitions) // (max_workers * 4))
+                ))
         
-        for user_id in range(1, users + 1):
-            # 用户基础能力（影响表现趋势）
-            base_ability = random.uniform(0.3, 0.9)
-            learning_rate = random.uniform(0.001, 0.01)  # 学习进步率
-            
-            for day in range(days):
-                current_date = start_date + timedelta(days=day)
-                
-                # 能力随时间增长
-                current_ability = min(1.0, base_ability + learning_rate * day)
-                
-                # 添加随机波动
-                daily_performance = current_ability * random.uniform(0.7, 1.3)
-                daily_performance = max(0, min(1, daily_performance))
-                
-                # 生成具体指标
-                data.append({
-                    'date': current_date.date(),
-                    'user_id': user_id,
-                    'completion_rate': daily_performance,
-                    'accuracy': daily_performance * random.uniform(0.8, 1.1),
-                    'learning_time': int(daily_performance * random.uniform(60, 240)),  # 分钟
-                    'engagement_score': daily_performance * random.uniform(0.6, 1.0),
-                    'difficulty_level': random.choice([1, 2, 3, 4, 5])
-                })
-        
-        return pd.DataFrame(data)
+        if not frames:
+            return self._behavior_frame([])
+        
+        # 分区结果按用户分区排列，稳定排序后恢复按天排列的顺序
+        merged = pd.concat(frames, ignore_index=True)
+        day_order = merged['start_time'].dt.normalize()
+        merged = merged.iloc[np.argsort(day_order.values, kind='stable')].reset_index(drop=True)
+        return merged
+    
+    def generate_performance_data(self, users: Optional[int] = None, days: int = 30) -> pd.DataFrame:
+        """生成学习表现数据"""
+        users = self._default_users(users)
+        start_date = self._get_start_date(days)
+        frames = [self._generate_performance_block(start_date, days, partition, users)
+                  for partition in range(self._user_partition_count(users))]
+        if not frames:
+            return self._generate_performance_block(start_date, days, 0, 0)
+        return pd.concat(frames, ignore_index=True)
     
     def generate_resource_usage_data(self, days: int = 30) -> pd.DataFrame:
         """生成资源使用数据"""
-        data = []
-        start_date = datetime.now() - timedelta(days=days)
+        start_date = self._get_start_date(days)
+        return self._generate_resource_usage_block(start_date, 0, days)
+    
+    # 流式生成方法：按固定行数分块产出，内存占用与 days/users 无关
+    def iter_chunks(self, kind: str, chunk_size: Optional[int] = None, **kwargs) -> Iterator[pd.DataFrame]:
+        """按数据类型流式生成数据块
+        
+        kind 可选值: usage, environment, learning_behavior, performance, resource_usage
+        """
+        generators = {
+            'usage': self.iter_usage_data,
+            'environment': self.iter_environment_data,
+            'learning_behavior': self.iter_learning_behavior_data,
+            'performance': self.iter_performance_data,
+            'resource_usage': self.iter_resource_usage_data
+        }
+        if kind not in generators:
+            raise ValueError(f"Unknown data kind: {kind}")
+        return generators[kind](chunk_size=chunk_size, **kwargs)
+    
+    def stream_to_storage(self, storage: Any, kind: str, table_name: Optional[str] = None,
+                          chunk_size: Optional[int] = None, if_exists: str = 'replace', **kwargs) -> int:
+        """将流式生成的数据块直接批量写入存储，返回写入的行数
+        
+        Args:
+            storage: DataStorage 实例
+            kind: 数据类型，同 iter_chunks
+            table_name: 表名，默认为 "<kind>_data"
+        """
+        table_name = table_name or get_table_name(kind)
+        return storage.bulk_ingest(self.iter_chunks(kind, chunk_size=chunk_size, **kwargs), table_name,
+                                   if_exists=if_exists)
+    
+    def iter_usage_data(self, days: int = 30, spaces: Optional[List[str]] = None,
+                        chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """流式生成空间使用数据"""
+        if spaces is None:
+            spaces = list(self.space_types['physical'].keys())
         
-        resources = ['计算机', '图书', '实验设备', '投影仪', '网络', '打印机']
+        start_date = self._get_start_date(days)
+        blocks = self._iter_day_blocks(
+            days, len(spaces) * 24, chunk_size,
+            lambda first_day, n_days: self._generate_usage_block(start_date, first_day, n_days, spaces)
+        )
+        return self._rechunk(blocks, chunk_size)
+    
+    def iter_environment_data(self, days: int = 30, spaces: Optional[List[str]] = None,
+                              interval_minutes: int = 60, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """流式生成环境数据"""
+        if spaces is None:
+            spaces = list(self.space_types['physical'].keys())
+        
+        start_date = self._get_start_date(days)
+        rows_per_day = len(spaces) * len(self._sample_minutes(interval_minutes))
+        blocks = self._iter_day_blocks(
+            days, rows_per_day, chunk_size,
+            lambda first_day, n_days: self._generate_environment_block(
+                start_date, first_day, n_days, spaces, interval_minutes
+            )
+        )
+        return self._rechunk(blocks, chunk_size)
+    
+    def iter_learning_behavior_data(self, users: Optional[int] = None, days: int = 30,
+                                    chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """流式生成学习行为数据"""
+        users = self._default_users(users)
+        start_date = self._get_start_date(days)
+        
+        # 每天的会话数约与用户数相当，按用户数估算每天的行数
+        blocks = self._iter_day_blocks(
+            days, max(1, users), chunk_size,
+            lambda first_day, n_days: self._generate_learning_behavior_block(start_date, first_day, n_days, users)
+        )
+        return self._rechunk(blocks, chunk_size)
+    
+    def iter_performance_data(self, users: Optional[int] = None, days: int = 30,
+                              chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """流式生成学习表现数据（按用户分区生成，保持每个用户的能力增长趋势）"""
+        users = self._default_users(users)
+        start_date = self._get_start_date(days)
+        blocks = (
+            self._generate_performance_block(start_date, days, partition, users)
+            for partition in range(self._user_partition_count(users))
+        )
+        return self._rechunk(blocks, chunk_size)
+    
+    def iter_resource_usage_data(self, days: int = 30, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """流式生成资源使用数据"""
+        start_date = self._get_start_date(days)
+        rows_per_day = len(self.resources) * 14
+        blocks = self._iter_day_blocks(
+            days, rows_per_day, chunk_size,
+            lambda first_day, n_days: self._generate_resource_usage_block(start_date, first_day, n_days)
+        )
+        return self._rechunk(blocks, chunk_size)
+    
+    def _iter_day_blocks(self, days: int, rows_per_day: int, chunk_size: Optional[int],
+                         block_func: Callable[[int, int], pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """按天切分生成区间，每个区间约含 chunk_size 行"""
+        chunk_size = chunk_size or PerformanceConfig.SIMULATOR_CHUNK_SIZE
+        days_per_block = max(1, chunk_size // max(1, rows_per_day))
+        
+        for first_day in range(0, days, days_per_block):
+            yield block_func(first_day, min(days_per_block, days - first_day))
+    
+    def _rechunk(self, blocks: Iterable[pd.DataFrame], chunk_size: Optional[int]) -> Iterator[pd.DataFrame]:
+        """将不定长的数据块重新切分为固定行数的数据块（最后一块可能不足）"""
+        chunk_size = chunk_size or PerformanceConfig.SIMULATOR_CHUNK_SIZE
+        buffer: List[pd.DataFrame] = []
+        buffered_rows = 0
         
-        for day in range(days):
-            current_date = start_date + timedelta(days=day)
-            is_weekend = current_date.weekday() >= 5
+        for block in blocks:
+            if block.empty:
+                continue
+            buffer.append(block)
+            buffered_rows += len(block)
             
-            for resource in resources:
-                # 工作日使用更频繁
-                base_usage = 0.3 if is_weekend else 0.7
-                
-                for hour in range(8, 22):  # 开放时间
-                    hour_factor = self._get_hour_factor(hour, is_weekend)
-                    usage_count = int(base_usage * hour_factor * random.uniform(5, 30))
-                    
-                    data.append({
-                        'timestamp': current_date.replace(hour=hour, minute=0),
-                        'resource': resource,
-                        'usage_count': usage_count,
-                        'availability': random.uniform(0.8, 1.0),
-                        'maintenance_status': random.choice(['正常', '正常', '正常', '维护中'])
-                    })
-        
-        return pd.DataFrame(data)
+            if buffered_rows < chunk_size:
+                continue
+            
+            merged = pd.concat(buffer, ignore_index=True) if len(buffer) > 1 else block.reset_index(drop=True)
+            offset = 0
+            while buffered_rows - offset >= chunk_size:
+                yield merged.iloc[offset:offset + chunk_size].reset_index(drop=True)
+                offset += chunk_size
+            
+            buffer = [merged.iloc[offset:]] if offset < buffered_rows else []
+            buffered_rows -= offset
+        
+        if buffered_rows:
+            yield pd.concat(buffer, ignore_index=True)
+    
+    # 随机流管理：每个 (数据类型, 天, 用户分区) 使用独立派生的随机流，
+    # 因此无论分块大小、生成顺序或进程数如何，同一种子的结果逐位相同
+    def _partition_rng(self, kind: str, *keys: int) -> np.random.Generator:
+        """获取指定分区的独立随机数生成器"""
+        seed_sequence = np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=(self.STREAM_IDS[kind], *keys)
+        )
+        return np.random.default_rng(seed_sequence)
+    
+    def _get_start_date(self, days: int) -> datetime:
+        """获取数据起始时间"""
+        reference_date = self.reference_date or datetime.now()
+        return reference_date - timedelta(days=days)
+    
+    def _default_users(self, users: Optional[int]) -> int:
+        """获取用户数：未指定时使用规模档案建议的用户数，没有规模档案时为100"""
+        if users is not None:
+            return users
+        return self.scale_users if self.scale_users is not None else 100
+    
+    def _user_partition_count(self, users: int) -> int:
+        """获取用户分区数量"""
+        return -(-users // self.USER_PARTITION_SIZE)
+    
+    def _user_partition_range(self, partition: int, users: int) -> range:
+        """获取用户分区包含的用户ID范围"""
+        first_user = partition * self.USER_PARTITION_SIZE + 1
+        return range(first_user, min(users, first_user + self.USER_PARTITION_SIZE - 1) + 1)
+    
+    # 区间生成方法：生成从 start_date 起第 first_day 天开始的若干天数据
+    def _generate_usage_block(self, start_date: datetime, first_day: int, days: int,
+                              spaces: List[str]) -> pd.DataFrame:
+        """生成指定区间的空间使用数据"""
+        dates = pd.date_range(start_date + timedelta(days=first_day), periods=days, freq='D')
+        
+        # 工作日和周末的使用模式不同
+        is_weekend = np.asarray(dates.weekday >= 5)
+        base_usage = np.where(is_weekend, 0.6, 0.8)
+        
+        # 构建 天×空间×小时 网格：使用率 = 基础使用率 × 小时因子 × 随机波动
+        hour_factor = self._hour_factor_table()[is_weekend.astype(np.intp)]
+        noise = np.stack([
+            self._partition_rng('usage', day).uniform(0.7, 1.3, size=(len(spaces), 24))
+            for day in range(first_day, first_day + days)
+        ]) if days else np.empty((0, len(spaces), 24))
+        usage_rate = base_usage[:, None, None] * hour_factor[:, None, :] * noise
+        usage_rate = np.clip(usage_rate, 0, 1)  # 限制在0-1之间
+        
+        capacity = np.array(
+            [self.space_types['physical'].get(space, {}).get('capacity', 50) for space in spaces],
+            dtype=np.int64
+        )
+        actual_users = (capacity[None, :, None] * usage_rate).astype(np.int64)
+        
+        # 按列构建DataFrame，避免逐行创建字典
+        rows_per_day = len(spaces) * 24
+        df = pd.DataFrame({
+            'date': np.repeat(dates.normalize().values, rows_per_day),
+            'hour': np.tile(np.arange(24), days * len(spaces)),
+            'space': np.tile(np.repeat(np.array(spaces, dtype=object), 24), days),
+            'users': actual_users.ravel(),
+            'capacity': np.broadcast_to(capacity[None, :, None], usage_rate.shape).ravel(),
+            'usage_rate': usage_rate.ravel(),
+            'is_weekend': np.repeat(is_weekend, rows_per_day)
+        })
+        return apply_schema(df, 'usage_data', categories={'space': spaces})
+    
+    def _generate_environment_block(self, start_date: datetime, first_day: int, days: int,
+                                    spaces: List[str], interval_minutes: int = 60) -> pd.DataFrame:
+        """生成指定区间的环境数据（向量化实现）"""
+        minutes = self._sample_minutes(interval_minutes)
+        shape = (days, len(spaces), len(minutes))
+        
+        day_starts = pd.date_range(
+            pd.Timestamp(start_date).normalize() + pd.Timedelta(days=first_day), periods=days, freq='D'
+        )
+        is_weekend = np.asarray(day_starts.weekday >= 5)
+        hours = minutes // 60
+        
+        # 根据使用率调整环境参数
+        usage_factor = self._hour_factor_table()[is_weekend.astype(np.intp)][:, hours][:, None, :]
+        
+        # 根据空间档案生成基础环境参数
+        profiles = [self.environment_profiles.get(space, self.default_environment_profile) for space in spaces]
+        base = {
+            key: np.array([profile[key] for profile in profiles], dtype=np.float64)[None, :, None]
+            for key in ('temperature', 'humidity', 'co2', 'noise')
+        }
+        
+        # 每天一个独立随机流，一次性抽取当天所有空间、所有采样点的噪声
+        draws = [self._environment_draws(day, shape[1:]) for day in range(first_day, first_day + days)]
+        draw = {
+            key: np.stack([day_draw[key] for day_draw in draws]) if days else np.empty(shape)
+            for key in ('temperature', 'humidity', 'co2', 'temperature_shift', 'humidity_shift',
+                        'co2_shift', 'noise_shift')
+        }
+        
+        temperature = base['temperature'] + draw['temperature'] + usage_factor * draw['temperature_shift']
+        humidity = base['humidity'] + draw['humidity'] + usage_factor * draw['humidity_shift']
+        co2 = base['co2'] + draw['co2'] + usage_factor * draw['co2_shift']
+        
+        # 使用率影响噪音
+        noise_level = base['noise'] + usage_factor * 15 + draw['noise_shift']
+        
+        # 自然光变化 + 人工光照
+        hour_of_day = minutes / 60
+        natural_light = np.where(
+            (hour_of_day >= 6) & (hour_of_day <= 18), 100 * (1 - np.abs(hour_of_day - 12) / 6), 20
+        )
+        light_level = natural_light[None, None, :] + 60 + usage_factor * 20
+        
+        timestamps = (
+            day_starts.values[:, None, None] + (minutes * np.timedelta64(1, 'm'))[None, None, :]
+        )
+        
+        df = pd.DataFrame({
+            'timestamp': np.broadcast_to(timestamps, shape).ravel(),
+            'space': np.tile(np.repeat(np.array(spaces, dtype=object), len(minutes)), days),
+            'temperature': temperature.ravel(),
+            'humidity': humidity.ravel(),
+            'co2': co2.ravel(),
+            'noise_level': noise_level.ravel(),
+            'light_level': np.broadcast_to(light_level, shape).ravel()
+        })
+        return apply_schema(df, 'environment_data', categories={'space': spaces})
+    
+    def _environment_draws(self, day: int, shape: tuple) -> Dict[str, np.ndarray]:
+        """抽取某一天环境数据所需的全部随机数"""
+        rng = self._partition_rng('environment', day)
+        return {
+            'temperature': rng.normal(0, 2, size=shape),
+            'humidity': rng.normal(0, 5, size=shape),
+            'co2': rng.normal(0, 50, size=shape),
+            'temperature_shift': rng.uniform(-1, 3, size=shape),
+            'humidity_shift': rng.uniform(-5, 10, size=shape),
+            'co2_shift': rng.uniform(0, 200, size=shape),
+            'noise_shift': rng.uniform(-5, 5, size=shape)
+        }
+    
+    def _sample_minutes(self, interval_minutes: int) -> np.ndarray:
+        """获取一天内的采样时刻（距零点的分钟数）"""
+        if interval_minutes <= 0:
+            raise ValueError(f"interval_minutes must be positive, got {interval_minutes}")
+        return np.arange(0, 24 * 60, interval_minutes)
+    
+    def _generate_learning_behavior_block(self, start_date: datetime, first_day: int, days: int,
+                                          users: int) -> pd.DataFrame:
+        """生成指定区间的学习行为数据"""
+        profiles = [
+            self._generate_partition_profiles(partition, users)
+            for partition in range(self._user_partition_count(users))
+        ]
+        sessions = [
+            self._generate_learning_sessions(start_date, day, partition, partition_profiles)
+            for day in range(first_day, first_day + days)
+            for partition, partition_profiles in enumerate(profiles)
+        ]
+        return self._behavior_frame(sessions)
+    
+    def _generate_behavior_partition(self, start_date: datetime, days: int, partition: int,
+                                     users: int) -> pd.DataFrame:
+        """生成单个用户分区在全部天数内的学习行为数据（进程池工作单元）"""
+        profiles = self._generate_partition_profiles(partition, users)
+        return self._behavior_frame([
+            self._generate_learning_sessions(start_date, day, partition, profiles) for day in range(days)
+        ])
+    
+    def _behavior_frame(self, sessions: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+        """合并学习会话数组并设置分类列"""
+        columns = ['user_id', 'start_time', 'duration_minutes', 'space', 'activity_type',
+                   'focus_level', 'satisfaction']
+        if sessions:
+            data = {column: np.concatenate([session[column] for session in sessions]) for column in columns}
+        else:
+            data = {column: np.empty(0, dtype=np.int64) for column in columns}
+            data['start_time'] = np.empty(0, dtype='datetime64[ns]')
+            data['focus_level'] = np.empty(0, dtype=np.float64)
+            data['satisfaction'] = np.empty(0, dtype=np.float64)
+        
+        # 空间和活动类型使用固定类别的分类列，保证不同分块、不同分区的类别一致
+        space_names = list(self.space_types['physical'].keys())
+        data['space'] = pd.Categorical.from_codes(data['space'].astype(np.int64), categories=space_names)
+        data['activity_type'] = pd.Categorical.from_codes(
+            data['activity_type'].astype(np.int64), categories=self.activity_types
+        )
+        return apply_schema(pd.DataFrame(data, columns=columns), 'learning_behavior_data')
+    
+    def _generate_performance_block(self, start_date: datetime, days: int, partition: int,
+                                    users: int) -> pd.DataFrame:
+        """生成指定用户分区的学习表现数据（按 用户×天 网格向量化生成）"""
+        rng = self._partition_rng('performance', partition)
+        user_ids = np.array(self._user_partition_range(partition, users), dtype=np.int64)
+        shape = (len(user_ids), days)
+        dates = pd.date_range(pd.Timestamp(start_date).normalize(), periods=days, freq='D')
+        
+        # 用户基础能力（影响表现趋势）和学习进步率
+        base_ability = rng.uniform(0.3, 0.9, size=len(user_ids))
+        learning_rate = rng.uniform(0.001, 0.01, size=len(user_ids))
+        
+        # 能力随时间增长，再添加随机波动
+        current_ability = np.minimum(1.0, base_ability[:, None] + learning_rate[:, None] * np.arange(days)[None, :])
+        daily_performance = np.clip(current_ability * rng.uniform(0.7, 1.3, size=shape), 0, 1)
+        
+        # 按列构建DataFrame，行顺序为先用户后天数
+        df = pd.DataFrame({
+            'date': np.tile(dates.values, len(user_ids)),
+            'user_id': np.repeat(user_ids, days),
+            'completion_rate': daily_performance.ravel(),
+            'accuracy': (daily_performance * rng.uniform(0.8, 1.1, size=shape)).ravel(),
+            'learning_time': (daily_performance * rng.uniform(60, 240, size=shape)).astype(np.int64).ravel(),  # 分钟
+            'engagement_score': (daily_performance * rng.uniform(0.6, 1.0, size=shape)).ravel(),
+            'difficulty_level': rng.integers(1, 6, size=shape).ravel()
+        })
+        return apply_schema(df, 'performance_data')
+    
+    def _generate_resource_usage_block(self, start_date: datetime, first_day: int, days: int) -> pd.DataFrame:
+        """生成指定区间的资源使用数据（按 天×资源×开放小时 网格向量化生成）"""
+        hours = np.arange(8, 22)  # 开放时间
+        shape = (len(self.resources), len(hours))
+        maintenance_codes = np.array([0, 0, 0, 1])  # 按 正常:维护中 = 3:1 抽取维护状态
+        
+        day_starts = pd.date_range(
+            pd.Timestamp(start_date).normalize() + pd.Timedelta(days=first_day), periods=days, freq='D'
+        )
+        is_weekend = np.asarray(day_starts.weekday >= 5)
+        
+        # 工作日使用更频繁
+        base_usage = np.where(is_weekend, 0.3, 0.7)
+        hour_factor = self._hour_factor_table()[is_weekend.astype(np.intp)][:, hours]
+        
+        # 每天一个独立随机流，一次性抽取当天所有资源、所有小时的随机数
+        draws = [self._resource_usage_draws(day, shape) for day in range(first_day, first_day + days)]
+        draw = {
+            key: np.stack([day_draw[key] for day_draw in draws]) if days else np.empty((0,) + shape)
+            for key in ('usage', 'availability', 'maintenance')
+        }
+        usage_count = (base_usage[:, None, None] * hour_factor[:, None, :] * draw['usage']).astype(np.int64)
+        
+        # 时间戳保留起始时间的秒和微秒，与 datetime.replace(hour=..., minute=0) 一致
+        offset = pd.Timedelta(seconds=start_date.second, microseconds=start_date.microsecond)
+        timestamps = day_starts.values[:, None] + (hours * np.timedelta64(1, 'h') + offset.to_timedelta64())[None, :]
+        
+        df = pd.DataFrame({
+            'timestamp': np.broadcast_to(timestamps[:, None, :], (days,) + shape).ravel(),
+            'resource': pd.Categorical.from_codes(
+                np.tile(np.repeat(np.arange(len(self.resources)), len(hours)), days), categories=self.resources
+            ),
+            'usage_count': usage_count.ravel(),
+            'availability': draw['availability'].ravel(),
+            'maintenance_status': pd.Categorical.from_codes(
+                maintenance_codes[draw['maintenance'].astype(np.intp)].ravel(), categories=['正常', '维护中']
+            )
+        })
+        return apply_schema(df, 'resource_usage_data')
+    
+    def _resource_usage_draws(self, day: int, shape: tuple) -> Dict[str, np.ndarray]:
+        """抽取某一天资源使用数据所需的全部随机数"""
+        rng = self._partition_rng('resource_usage', day)
+        return {
+            'usage': rng.uniform(5, 30, size=shape),
+            'availability': rng.uniform(0.8, 1.0, size=shape),
+            'maintenance': rng.integers(4, size=shape)
+        }
     
     def _get_hour_factor(self, hour: int, is_weekend: bool) -> float:
         """获取小时因子（影响使用率）"""
@@ -222,78 +652,80 @@ class DataSimulator:
             else:
                 return 0.1
     
-    def _get_noise_level(self, space: str, usage_factor: float) -> float:
-        """获取噪音水平"""
-        base_noise = {
-            '图书馆': 30, '自习室': 25, '实验室': 45,
-            '教室': 40, '咖啡厅': 55
-        }.get(space, 35)
+    def _hour_factor_table(self) -> np.ndarray:
+        """获取小时因子查找表，形状为 (2, 24)，第一维为是否周末"""
+        if self._hour_factors is None:
+            self._hour_factors = np.array([
+                [self._get_hour_factor(hour, is_weekend) for hour in range(24)]
+                for is_weekend in (False, True)
+            ])
+        return self._hour_factors
+    
+    def _generate_partition_profiles(self, partition: int, users: int) -> Dict[str, np.ndarray]:
+        """生成用户分区内所有用户的档案（以数组形式存储各属性的编号）"""
+        rng = self._partition_rng('user_profiles', partition)
+        user_ids = np.array(self._user_partition_range(partition, users), dtype=np.int64)
+        n_users = len(user_ids)
+        n_spaces = len(self.space_types['physical'])
+        max_preferred = min(4, n_spaces)
         
-        # 使用率影响噪音
-        noise_increase = usage_factor * 15
-        return base_noise + noise_increase + random.uniform(-5, 5)
-    
-    def _get_light_level(self, hour: int, usage_factor: float) -> float:
-        """获取光照水平"""
-        # 自然光变化
-        if 6 <= hour <= 18:
-            natural_light = 100 * (1 - abs(hour - 12) / 6)
-        else:
-            natural_light = 20
-        
-        # 人工光照
-        artificial_light = 60 + usage_factor * 20
-        
-        return natural_light + artificial_light
-    
-    def _generate_user_profiles(self, count: int) -> Dict[int, Dict[str, Any]]:
-        """生成用户档案"""
-        profiles = {}
-        behavior_types = list(self.behavior_patterns.keys())
-        
-        for user_id in range(1, count + 1):
-            profiles[user_id] = {
-                'behavior_type': random.choice(behavior_types),
-                'preferred_spaces': random.sample(
-                    list(self.space_types['physical'].keys()), 
-                    random.randint(2, 4)
-                ),
-                'skill_level': random.choice(['初级', '中级', '高级']),
-                'learning_style': random.choice(['视觉型', '听觉型', '动手型', '阅读型'])
-            }
+        # 每个用户不放回地抽取若干个偏好空间：第j次在剩余空间中抽取，再跳过已选空间映射回原编号，
+        # 复杂度与空间数量无关，适用于大规模空间目录
+        preferred_spaces = np.zeros((n_users, max_preferred), dtype=np.int64)
+        for j in range(max_preferred):
+            picks = rng.integers(0, n_spaces - j, size=n_users)
+            for chosen in np.sort(preferred_spaces[:, :j], axis=1).T:
+                picks += picks >= chosen
+            preferred_spaces[:, j] = picks
         
-        return profiles
+        return {
+            'user_id': user_ids,
+            'behavior_type': rng.integers(len(self.behavior_patterns), size=n_users),
+            'preferred_spaces': preferred_spaces,
+            'preferred_count': rng.integers(min(2, max_preferred), max_preferred + 1, size=n_users),
+            'skill_level': rng.integers(len(self.skill_levels), size=n_users),
+            'learning_style': rng.integers(len(self.learning_styles), size=n_users)
+        }
     
-    def _generate_learning_sessions(self, user_id: int, profile: Dict[str, Any], date: datetime) -> List[Dict[str, Any]]:
-        """生成学习会话"""
-        sessions = []
-        behavior = self.behavior_patterns[profile['behavior_type']]
+    def _generate_learning_sessions(self, start_date: datetime, day: int, partition: int,
+                                    profiles: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """生成某一天内一个用户分区的所有学习会话"""
+        rng = self._partition_rng('learning_behavior', day, partition)
+        current_date = pd.Timestamp(start_date) + pd.Timedelta(days=day)
         
-        # 根据行为模式决定学习时间
-        session_count = random.randint(1, 3)
+        # 根据用户类型决定是否学习
+        learning_probability = 0.3 if current_date.weekday() >= 5 else 0.8
+        is_learning = rng.random(len(profiles['user_id'])) <= learning_probability
         
-        for _ in range(session_count):
-            # 选择学习时间
-            hour = random.choice(behavior['peak_hours'])
-            start_time = date.replace(hour=hour, minute=random.randint(0, 59))
-            
-            # 学习时长
-            duration = random.randint(30, 180)  # 30分钟到3小时
-            
-            # 选择空间
-            space = random.choice(profile['preferred_spaces'])
-            
-            sessions.append({
-                'user_id': user_id,
-                'start_time': start_time,
-                'duration_minutes': duration,
-                'space': space,
-                'activity_type': random.choice(['阅读', '编程', '写作', '研究', '讨论']),
-                'focus_level': random.uniform(0.3, 1.0),
-                'satisfaction': random.uniform(0.5, 1.0)
-            })
-        
-        return sessions
+        # 每个学习用户生成1-3个会话
+        session_count = np.where(is_learning, rng.integers(1, 4, size=len(is_learning)), 0)
+        owner = np.repeat(np.arange(len(is_learning)), session_count)
+        n_sessions = len(owner)
+        
+        # 根据行为模式的高峰时段选择学习时间
+        peak_hours = [pattern['peak_hours'] for pattern in self.behavior_patterns.values()]
+        peak_len = np.array([len(hours) for hours in peak_hours])
+        peak_table = np.array([hours + hours[-1:] * (peak_len.max() - len(hours)) for hours in peak_hours])
+        behavior_type = profiles['behavior_type'][owner]
+        hour = peak_table[behavior_type, (rng.random(n_sessions) * peak_len[behavior_type]).astype(np.int64)]
+        minute = rng.integers(0, 60, size=n_sessions)
+        start_time = (
+            np.datetime64(current_date.normalize().to_datetime64(), 'm')
+            + (hour * 60 + minute).astype('timedelta64[m]')
+        ).astype('datetime64[ns]')
+        
+        # 从偏好空间中选择学习空间
+        preferred_index = (rng.random(n_sessions) * profiles['preferred_count'][owner]).astype(np.int64)
+        
+        return {
+            'user_id': profiles['user_id'][owner],
+            'start_time': start_time,
+            'duration_minutes': rng.integers(30, 181, size=n_sessions),  # 30分钟到3小时
+            'space': profiles['preferred_spaces'][owner, preferred_index],
+            'activity_type': rng.integers(len(self.activity_types), size=n_sessions),
+            'focus_level': rng.uniform(0.3, 1.0, size=n_sessions),
+            'satisfaction': rng.uniform(0.5, 1.0, size=n_sessions)
+        }
 
 
 # 兼容性别名
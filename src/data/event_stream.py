@@ -0,0 +1,175 @@
+"""
+实时事件流模拟器
+"""
+
+import asyncio
+import json
+import time
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import logging
+
+from .data_simulator import DataSimulator
+
+
+class SensorEventStream:
+    """传感器与空间占用的实时事件流模拟器
+    
+    按配置的速率产生占用事件和环境事件，写入 asyncio.Queue 或本地套接字（NDJSON），
+    用于在没有真实传感器的情况下测量数据接入和聚合的端到端延迟。
+    事件复用 DataSimulator 的小时因子、空间容量和环境档案模型。
+    """
+    
+    def __init__(self, simulator: Optional[DataSimulator] = None, spaces: Optional[List[str]] = None,
+                 events_per_second: float = 1000, occupancy_ratio: float = 0.5, tick_interval: float = 0.01):
+        """
+        Args:
+            simulator: 数据模拟器，默认新建一个
+            spaces: 产生事件的空间列表，默认为全部物理空间
+            events_per_second: 目标事件速率
+            occupancy_ratio: 占用事件占全部事件的比例，其余为环境事件
+            tick_interval: 调度间隔（秒），每个间隔内批量产生到期的事件
+        """
+        if events_per_second <= 0:
+            raise ValueError(f"events_per_second must be positive, got {events_per_second}")
+        
+        self.logger = logging.getLogger(__name__)
+        self.simulator = simulator or DataSimulator()
+        self.spaces = spaces or list(self.simulator.space_types['physical'].keys())
+        self.events_per_second = events_per_second
+        self.occupancy_ratio = occupancy_ratio
+        self.tick_interval = tick_interval
+        self.rng = self.simulator.rng
+        
+        self._capacity = np.array([
+            self.simulator.space_types['physical'].get(space, {}).get('capacity', 50) for space in self.spaces
+        ])
+        profiles = [
+            self.simulator.environment_profiles.get(space, self.simulator.default_environment_profile)
+            for space in self.spaces
+        ]
+        self._base = {
+            key: np.array([profile[key] for profile in profiles], dtype=np.float64)
+            for key in ('temperature', 'humidity', 'co2', 'noise')
+        }
+        
+        self.stats = {'events_emitted': 0, 'batches': 0, 'lag_events': 0}
+        self._sequence = 0
+    
+    def generate_batch(self, size: int, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """生成一批事件"""
+        now = now or datetime.now()
+        emitted_at = time.time()
+        is_weekend = now.weekday() >= 5
+        hour_factor = self.simulator._hour_factor_table()[int(is_weekend), now.hour]
+        
+        space_index = self.rng.integers(len(self.spaces), size=size)
+        is_occupancy = self.rng.random(size) < self.occupancy_ratio
+        
+        # 占用事件：与 generate_usage_data 相同的使用率模型
+        base_usage = 0.6 if is_weekend else 0.8
+        usage_rate = np.clip(base_usage * hour_factor * self.rng.uniform(0.7, 1.3, size=size), 0, 1)
+        users = (self._capacity[space_index] * usage_rate).astype(np.int64)
+        
+        # 环境事件：与 generate_environment_data 相同的环境模型
+        temperature = (self._base['temperature'][space_index] + self.rng.normal(0, 2, size=size)
+                       + hour_factor * self.rng.uniform(-1, 3, size=size))
+        humidity = (self._base['humidity'][space_index] + self.rng.normal(0, 5, size=size)
+                    + hour_factor * self.rng.uniform(-5, 10, size=size))
+        co2 = (self._base['co2'][space_index] + self.rng.normal(0, 50, size=size)
+               + hour_factor * self.rng.uniform(0, 200, size=size))
+        noise_level = self._base['noise'][space_index] + hour_factor * 15 + self.rng.uniform(-5, 5, size=size)
+        
+        timestamp = now.isoformat()
+        events = []
+        for i in range(size):
+            self._sequence += 1
+            space = self.spaces[space_index[i]]
+            if is_occupancy[i]:
+                events.append({
+                    'event_id': self._sequence,
+                    'event_type': 'occupancy',
+                    'timestamp': timestamp,
+                    'emitted_at': emitted_at,
+                    'space': space,
+                    'users': int(users[i]),
+                    'capacity': int(self._capacity[space_index[i]]),
+                    'usage_rate': float(usage_rate[i])
+                })
+            else:
+                events.append({
+                    'event_id': self._sequence,
+                    'event_type': 'environment',
+                    'timestamp': timestamp,
+                    'emitted_at': emitted_at,
+                    'space': space,
+                    'temperature': float(temperature[i]),
+                    'humidity': float(humidity[i]),
+                    'co2': float(co2[i]),
+                    'noise_level': float(noise_level[i])
+                })
+        
+        return events
+    
+    async def produce(self, queue: asyncio.Queue, duration: Optional[float] = None,
+                      max_events: Optional[int] = None) -> int:
+        """按目标速率向队列写入事件，返回本次调用写入的事件数（累计数记录在 stats['events_emitted'] 中）
+        
+        队列已满时等待消费者（背压），因此实际速率可能低于目标速率，
+        落后的事件数记录在 stats['lag_events'] 中。
+        """
+        written = 0
+        async for batch in self._paced_batches(duration, max_events):
+            for event in batch:
+                await queue.put(event)
+            written += len(batch)
+        return written
+    
+    async def stream_to_socket(self, host: str = '127.0.0.1', port: int = 9000,
+                               duration: Optional[float] = None, max_events: Optional[int] = None) -> int:
+        """按目标速率将事件以NDJSON格式写入本地TCP套接字，返回写入的事件数"""
+        written = 0
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            async for batch in self._paced_batches(duration, max_events):
+                payload = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in batch)
+                writer.write(payload.encode('utf-8'))
+                await writer.drain()
+                written += len(batch)
+        except (ConnectionError, OSError) as e:
+            self.logger.error(f"Event stream connection to {host}:{port} lost: {str(e)}")
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        return written
+    
+    async def _paced_batches(self, duration: Optional[float], max_events: Optional[int]):
+        """按时间节拍产生事件批次，保持累计事件数与目标速率一致"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        emitted = 0
+        
+        while True:
+            elapsed = loop.time() - start
+            if duration is not None and elapsed >= duration:
+                break
+            if max_events is not None and emitted >= max_events:
+                break
+            
+            # 到期应发送的事件数 = 已过时间 × 速率 - 已发送数
+            due = int(elapsed * self.events_per_second) - emitted
+            if max_events is not None:
+                due = min(due, max_events - emitted)
+            
+            if due > 0:
+                yield self.generate_batch(due)
+                emitted += due
+                self.stats['events_emitted'] += due
+                self.stats['batches'] += 1
+            
+            # 生成和写入耗时超过一个节拍时记录落后量
+            lag = int((loop.time() - start) * self.events_per_second) - emitted
+            self.stats['lag_events'] = max(0, lag)
+            
+            await asyncio.sleep(self.tick_interval)
@@ -0,0 +1,191 @@
+"""
+场景回放器
+"""
+
+import asyncio
+import os
+import time
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any, Optional, Iterator
+import logging
+
+from .schema import apply_schema
+from ..config.settings import PerformanceConfig
+
+
+class ScenarioReplayer:
+    """从录制的事件日志（CSV或NDJSON）回放占用或学习行为数据
+    
+    回放输出与 DataSimulator 的数据块结构相同（按表结构转换列类型），
+    可以按原始节奏（1x）、加速（如10x）或不限速地送入数据分析和看板的处理流程。
+    日志需按时间列升序记录。
+    """
+    
+    TIME_COLUMNS = ['timestamp', 'start_time', 'date']
+    
+    def __init__(self, path: str, table_name: Optional[str] = None, speed: Optional[float] = 1.0,
+                 time_column: Optional[str] = None, chunk_size: Optional[int] = None):
+        """
+        Args:
+            path: 日志文件路径，扩展名为 .csv 或 .ndjson/.jsonl
+            table_name: 对应的数据表名（如 usage_data），用于转换列类型
+            speed: 回放倍速，None 表示不限速
+            time_column: 时间列，默认按 timestamp/start_time/date 顺序自动识别
+            chunk_size: 读取日志时每块的行数
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError(f"speed must be positive or None, got {speed}")
+        
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.table_name = table_name
+        self.speed = speed
+        self.time_column = time_column
+        self.chunk_size = chunk_size or PerformanceConfig.SIMULATOR_CHUNK_SIZE
+        
+        self.stats = {'rows_replayed': 0, 'batches': 0, 'max_lag_seconds': 0.0}
+        self._first_event: Optional[pd.Timestamp] = None
+        self._wall_start: Optional[float] = None
+    
+    def iter_chunks(self) -> Iterator[pd.DataFrame]:
+        """按回放节奏产出数据块"""
+        self._reset()
+        for chunk in self._read_chunks():
+            offsets = self._due_offsets(chunk)
+            pos = 0
+            while pos < len(chunk):
+                end = self._due_index(offsets, pos)
+                if end > pos:
+                    yield self._emit(chunk, pos, end, offsets)
+                    pos = end
+                else:
+                    time.sleep(self._wait_seconds(offsets, pos))
+    
+    async def produce(self, queue: asyncio.Queue, as_records: bool = True) -> int:
+        """按回放节奏写入 asyncio.Queue，返回写入的行数
+        
+        Args:
+            queue: 目标队列
+            as_records: True 时逐行写入字典事件（与 SensorEventStream 的事件一致），
+                False 时写入 DataFrame 数据块
+        """
+        self._reset()
+        for chunk in self._read_chunks():
+            offsets = self._due_offsets(chunk)
+            pos = 0
+            while pos < len(chunk):
+                end = self._due_index(offsets, pos)
+                if end == pos:
+                    await asyncio.sleep(self._wait_seconds(offsets, pos))
+                    continue
+                
+                batch = self._emit(chunk, pos, end, offsets)
+                pos = end
+                if not as_records:
+                    await queue.put(batch)
+                    continue
+                
+                emitted_at = time.time()
+                for record in self._to_records(batch):
+                    record['emitted_at'] = emitted_at
+                    await queue.put(record)
+        
+        return self.stats['rows_replayed']
+    
+    def to_storage(self, storage: Any, table_name: Optional[str] = None, if_exists: str = "replace",
+                   file_format: Optional[str] = None) -> int:
+        """按回放节奏将数据写入存储，返回写入的行数
+        
+        不限速时整体批量导入（bulk_ingest）；按节奏回放时每个到期的数据块单独追加写入并提交，
+        回放期间不长时间持有写锁，看板也能随回放读到新数据。
+        
+        Args:
+            storage: DataStorage 实例
+            table_name: 目标表名，默认为回放器的表名
+            if_exists: replace 覆盖已有数据，append 追加到已有数据
+            file_format: 文件格式（仅文件模式），不限速时默认与 bulk_ingest 相同，
+                按节奏回放时默认为 json（逐块追加写入WAL）
+        """
+        table_name = table_name or self.table_name
+        if table_name is None:
+            raise ValueError("table_name is required when replaying into storage")
+        if if_exists not in ("replace", "append"):
+            raise ValueError(f"Unsupported if_exists: {if_exists}")
+        
+        if self.speed is None:
+            return storage.bulk_ingest(self.iter_chunks(), table_name, if_exists=if_exists, file_format=file_format)
+        
+        rows = 0
+        mode = if_exists
+        for batch in self.iter_chunks():
+            if not storage.save_data(batch, table_name, file_format=file_format or "json", mode=mode):
+                self.logger.error(f"Replay into {table_name} stopped after {rows} rows: write failed")
+                break
+            rows += len(batch)
+            mode = "append"
+        return rows
+    
+    def _read_chunks(self) -> Iterator[pd.DataFrame]:
+        """分块读取日志文件并转换列类型"""
+        extension = os.path.splitext(self.path)[1].lower()
+        if extension == '.csv':
+            reader = pd.read_csv(self.path, chunksize=self.chunk_size, encoding='utf-8')
+        elif extension in ('.ndjson', '.jsonl'):
+            reader = pd.read_json(self.path, lines=True, chunksize=self.chunk_size, encoding='utf-8')
+        else:
+            raise ValueError(f"Unsupported replay log format: {extension}")
+        
+        for chunk in reader:
+            if self.time_column is None:
+                self.time_column = next((c for c in self.TIME_COLUMNS if c in chunk.columns), None)
+                if self.time_column is None:
+                    raise ValueError(f"No time column found in {self.path}")
+            
+            chunk[self.time_column] = pd.to_datetime(chunk[self.time_column])
+            if self.table_name:
+                chunk = apply_schema(chunk, self.table_name)
+            yield chunk.sort_values(self.time_column, kind='stable').reset_index(drop=True)
+    
+    def _reset(self):
+        """重置回放时钟和统计"""
+        self._first_event = None
+        self._wall_start = None
+        self.stats = {'rows_replayed': 0, 'batches': 0, 'max_lag_seconds': 0.0}
+    
+    def _due_offsets(self, chunk: pd.DataFrame) -> np.ndarray:
+        """计算每行相对回放开始的到期时间（墙钟秒数）"""
+        if self.speed is None:
+            return np.zeros(len(chunk))
+        
+        if self._first_event is None:
+            self._first_event = chunk[self.time_column].iloc[0]
+            self._wall_start = time.monotonic()
+        
+        seconds = (chunk[self.time_column] - self._first_event).dt.total_seconds().to_numpy()
+        return seconds / self.speed
+    
+    def _due_index(self, offsets: np.ndarray, pos: int) -> int:
+        """返回当前已到期的行的结束位置"""
+        if self.speed is None:
+            return len(offsets)
+        elapsed = time.monotonic() - self._wall_start
+        return max(pos, int(np.searchsorted(offsets, elapsed, side='right')))
+    
+    def _wait_seconds(self, offsets: np.ndarray, pos: int) -> float:
+        """距下一行到期的等待时间，单次最多等待1秒以便及时响应"""
+        elapsed = time.monotonic() - self._wall_start
+        return float(min(1.0, max(0.0, offsets[pos] - elapsed)))
+    
+    def _emit(self, chunk: pd.DataFrame, pos: int, end: int, offsets: np.ndarray) -> pd.DataFrame:
+        """截取到期的行并更新统计"""
+        if self.speed is not None:
+            lag = time.monotonic() - self._wall_start - offsets[pos]
+            self.stats['max_lag_seconds'] = max(self.stats['max_lag_seconds'], float(lag))
+        self.stats['rows_replayed'] += end - pos
+        self.stats['batches'] += 1
+        return chunk.iloc[pos:end]
+    
+    def _to_records(self, batch: pd.DataFrame) -> List[Dict[str, Any]]:
+        """将数据块转换为事件字典，时间列转为ISO字符串"""
+        return batch.astype({self.time_column: str}).to_dict('records')
@@ -0,0 +1,115 @@
+"""
+数据表结构定义
+"""
+
+import pandas as pd
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 各数据表的紧凑列类型：字符串列使用 category，数值列使用最小够用的宽度
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    'usage_data': {
+        'date': 'datetime64[ns]',
+        'hour': 'int8',
+        'space': 'category',
+        'users': 'int32',
+        'capacity': 'int32',
+        'usage_rate': 'float32',
+        'is_weekend': 'bool'
+    },
+    'environment_data': {
+        'timestamp': 'datetime64[ns]',
+        'space': 'category',
+        'temperature': 'float32',
+        'humidity': 'float32',
+        'co2': 'float32',
+        'noise_level': 'float32',
+        'light_level': 'float32'
+    },
+    'learning_behavior_data': {
+        'user_id': 'int32',
+        'start_time': 'datetime64[ns]',
+        'duration_minutes': 'int16',
+        'space': 'category',
+        'activity_type': 'category',
+        'focus_level': 'float32',
+        'satisfaction': 'float32'
+    },
+    'performance_data': {
+        'date': 'datetime64[ns]',
+        'user_id': 'int32',
+        'completion_rate': 'float32',
+        'accuracy': 'float32',
+        'learning_time': 'int16',
+        'engagement_score': 'float32',
+        'difficulty_level': 'int8'
+    },
+    'resource_usage_data': {
+        'timestamp': 'datetime64[ns]',
+        'resource': 'category',
+        'usage_count': 'int16',
+        'availability': 'float32',
+        'maintenance_status': 'category'
+    }
+}
+
+
+def get_table_name(kind: str) -> str:
+    """获取模拟数据类型对应的表名"""
+    return f"{kind}_data"
+
+
+def get_schema(table_name: str) -> Optional[Dict[str, str]]:
+    """获取数据表的列类型定义"""
+    return TABLE_SCHEMAS.get(table_name)
+
+
+def apply_schema(df: pd.DataFrame, table_name: str,
+                 categories: Optional[Dict[str, List]] = None) -> pd.DataFrame:
+    """按表结构转换列类型
+    
+    Args:
+        df: 数据
+        table_name: 表名，未定义结构的表原样返回
+        categories: 分类列的固定类别，保证不同数据块之间类别一致
+    """
+    schema = get_schema(table_name)
+    if schema is None:
+        return df
+    
+    converted = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        
+        series = df[column]
+        try:
+            if dtype == 'category':
+                if categories and column in categories:
+                    target = pd.CategoricalDtype(categories=categories[column])
+                    if series.dtype != target:
+                        converted[column] = series.astype(object).astype(target)
+                elif not isinstance(series.dtype, pd.CategoricalDtype):
+                    converted[column] = series.astype('category')
+            elif dtype.startswith('datetime64'):
+                if series.dtype != dtype:
+                    converted[column] = pd.to_datetime(series).astype(dtype)
+            elif dtype == 'bool':
+                if series.dtype != bool and not series.isna().any():
+                    converted[column] = series.astype(bool)
+            elif series.dtype != dtype and not series.isna().any():
+                converted[column] = series.astype(dtype)
+        except (ValueError, TypeError) as e:
+            # 无法转换的列保持原类型
+            logger.debug(f"Keeping original dtype for {table_name}.{column}: {str(e)}")
+    
+    if not converted:
+        return df
+    
+    df = df.copy(deep=False)
+    for column, values in converted.items():
+        df[column] = values
+    return df
@@ -4,24 +4,86 @@
 
 import os
 import json
+import hashlib
+import shutil
 import pandas as pd
+import numpy as np
 import sqlite3
-from typing import Dict, List, Any, Optional, Union
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Union, Iterable, Iterator, BinaryIO, Callable
 import logging
 from datetime import datetime
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 
-from ..config.settings import DatabaseConfig
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow为可选依赖，缺失时批量导入回退到CSV
+    pa = None
+    pc = None
+    ds = None
+    pq = None
+
+try:
+    import zstandard as zstd
+except ImportError:  # zstandard为可选依赖，缺失时备份使用gzip压缩
+    zstd = None
+
+from .schema import apply_schema, get_schema
+from ..config.settings import DatabaseConfig, CacheConfig, PerformanceConfig
+from ..utils.file_lock import FileLock, VersionConflictError
 
 
 class DataStorage:
     """数据存储管理器"""
     
-    def __init__(self):
+    def __init__(self, table_indexes: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            table_indexes: 各表的二级索引列，默认使用 DatabaseConfig.TABLE_INDEXES
+        """
         self.logger = logging.getLogger(__name__)
         self.use_json = DatabaseConfig.USE_JSON_STORAGE
         self.data_dir = DatabaseConfig.DATA_DIR
         self.db_url = DatabaseConfig.DATABASE_URL
+        self.table_indexes = DatabaseConfig.TABLE_INDEXES if table_indexes is None else table_indexes
+        
+        # JSON文件的二级索引（按表缓存已读取的倒排表）
+        self.index_dir = os.path.join(self.data_dir, "_index")
+        self._file_indexes: Dict[str, Dict[str, Any]] = {}
+        
+        # SQLite连接池：每个线程复用一个长连接
+        self._local = threading.local()
+        self._connections: List[tuple] = []  # (创建连接的线程, 进程ID, 连接)
+        self._pool_generation = 0  # close() 后递增，各线程随后重新建立连接
+        self._pool_lock = threading.Lock()
+        
+        # 已加载数据表的LRU缓存（按字节数限制大小），以文件修改时间/大小或写入版本号判断是否失效
+        self.cache_max_bytes = CacheConfig.TABLE_CACHE_MAX_BYTES
+        self._table_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_bytes = 0
+        self._cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._write_versions: Counter = Counter()
+        
+        # 文件模式下每张表一把进程内锁，以及 data/_locks 下的跨进程读写锁（读取共享、写入排他）
+        self.lock_dir = os.path.join(self.data_dir, "_locks")
+        self._table_locks: Dict[str, threading.RLock] = {}
+        self._file_locks: Dict[str, FileLock] = {}
+        self._locks_guard = threading.Lock()
+        self._compacting: set = set()
+        
+        # 数据库查询的过滤列组合及次数，用于索引建议
+        self._query_patterns: Dict[str, Counter] = {}
         
         # 确保数据目录存在
         if self.use_json:
@@ -31,24 +93,73 @@ class DataStorage:
         if not self.use_json:
             self._init_database()
     
-    def save_data(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str = "json") -> bool:
-        """保存数据"""
+    WRITE_MODES = ("replace", "append", "upsert")
+    FILE_FORMATS = ("json", "csv", "parquet", "feather")
+    PARTITION_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+    AGG_FUNCTIONS = {"sum": "SUM", "mean": "AVG", "count": "COUNT", "min": "MIN", "max": "MAX"}
+    BACKUP_MANIFEST = "manifest.json"
+    BACKUP_BLOCK_SIZE = 1024 * 1024  # 数据库文件按块比较，块大小为页大小的整数倍
+    BACKUP_ARCHIVE = "data.tar"
+    BACKUP_CODECS = {"zstd": ".zst", "gzip": ".gz", "none": ""}  # 压缩方式及归档成员的扩展名
+    BACKUP_SPOOL_BYTES = 8 * 1024 * 1024  # 压缩结果超过该大小时暂存到临时文件
+    
+    def save_data(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str = "json",
+                  mode: str = "replace", key: Optional[Union[str, List[str]]] = None,
+                  expected_version: Optional[int] = None) -> bool:
+        """保存数据
+        
+        Args:
+            data: 数据
+            table_name: 表名
+            file_format: 文件格式（仅文件模式）
+            mode: replace 覆盖整表，append 追加记录，upsert 按 key 更新已有记录并插入新记录
+            key: upsert 模式的主键列
+            expected_version: 乐观并发控制（仅文件模式），取自读取数据时的 get_table_version；
+                期间表已被其他进程或线程修改时不写入并返回False
+        """
         try:
+            if mode not in self.WRITE_MODES:
+                raise ValueError(f"Unsupported write mode: {mode}")
+            if mode == "upsert" and not key:
+                raise ValueError("upsert mode requires key columns")
+            key = [key] if isinstance(key, str) else key
+            self._invalidate_table(table_name)
+            
             if self.use_json:
-                return self._save_to_file(data, table_name, file_format)
+                with self._table_lock(table_name, expected_version=expected_version):
+                    if mode == "append":
+                        return self._append_to_file(data, table_name, file_format)
+                    elif mode == "upsert":
+                        return self._upsert_to_file(data, table_name, file_format, key)
+                    return self._save_to_file(data, table_name, file_format)
             else:
+                if mode == "append":
+                    return self._ingest_to_database([self._to_dataframe(data)], table_name, "append") >= 0
+                elif mode == "upsert":
+                    return self._upsert_to_database(data, table_name, key)
                 return self._save_to_database(data, table_name)
+        except VersionConflictError as e:
+            self.logger.warning(f"Version conflict saving data to {table_name}: {str(e)}")
+            return False
         except Exception as e:
             self.logger.error(f"Error saving data to {table_name}: {str(e)}")
             return False
     
-    def load_data(self, table_name: str, file_format: str = "json") -> Optional[Union[Dict, pd.DataFrame]]:
-        """加载数据"""
+    def get_table_version(self, table_name: str) -> int:
+        """获取表的版本号（仅文件模式），每次写入后递增，用于 save_data 的 expected_version"""
+        return self._file_lock(table_name).version()
+    
+    def load_data(self, table_name: str, file_format: str = "json",
+                  columns: Optional[List[str]] = None) -> Optional[Union[Dict, pd.DataFrame]]:
+        """加载数据
+        
+        Args:
+            table_name: 表名
+            file_format: 文件格式（json/csv/parquet/feather，仅文件模式）
+            columns: 只加载指定的列；parquet、feather和数据库只读取这些列，json需完整解析后再筛选
+        """
         try:
-            if self.use_json:
-                return self._load_from_file(table_name, file_format)
-            else:
-                return self._load_from_database(table_name)
+            return self._load_table(table_name, file_format, columns)
         except Exception as e:
             self.logger.error(f"Error loading data from {table_name}: {str(e)}")
             return None
@@ -56,6 +167,7 @@ class DataStorage:
     def delete_data(self, table_name: str, condition: Optional[Dict] = None) -> bool:
         """删除数据"""
         try:
+            self._invalidate_table(table_name)
             if self.use_json:
                 return self._delete_from_file(table_name)
             else:
@@ -64,101 +176,444 @@ class DataStorage:
             self.logger.error(f"Error deleting data from {table_name}: {str(e)}")
             return False
     
-    def query_data(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None) -> Optional[pd.DataFrame]:
-        """查询数据"""
+    def query_data(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                   columns: Optional[List[str]] = None, file_format: str = "json") -> Optional[pd.DataFrame]:
+        """查询数据
+        
+        Args:
+            table_name: 表名
+            filters: 列名到取值的等值过滤条件，取值为列表、元组或集合时匹配其中任一值
+            limit: 最多返回的行数
+            columns: 只返回指定的列
+            file_format: 文件格式（仅文件模式）；json表按索引列过滤时只读取匹配的记录
+        """
         try:
-            if self.use_json:
-                data = self._load_from_file(table_name, "json")
+            if self._is_partitioned(table_name):
+                df = self.query_range(table_name, filters=filters, columns=columns, file_format=file_format)
+                return df.head(limit) if limit and df is not None else df
+            elif self.use_json and file_format == "parquet":
+                return self._apply_table_schema(
+                    self._query_from_parquet(table_name, filters, limit, columns), table_name
+                )
+            elif self.use_json and file_format == "feather":
+                return self._apply_table_schema(
+                    self._query_from_feather(table_name, filters, limit, columns), table_name
+                )
+            elif self.use_json:
+                if file_format == "json" and filters:
+                    df = self._query_from_json_index(table_name, filters, limit, columns)
+                    if df is not None:
+                        return df
+                
+                data = self._load_table(table_name, file_format)
                 if data is None:
                     return None
                 
                 # 转换为DataFrame（如果需要）
-                if isinstance(data, dict):
+                if not isinstance(data, pd.DataFrame):
                     df = pd.DataFrame(data)
                 else:
                     df = data
                 
                 # 应用过滤器
-                if filters:
-                    for column, value in filters.items():
-                        if column in df.columns:
-                            df = df[df[column] == value]
+                df = self._filter_dataframe(df, filters)
                 
                 # 应用限制
                 if limit:
                     df = df.head(limit)
                 
+                if columns:
+                    df = df[[column for column in columns if column in df.columns]]
+                
                 return df
             else:
-                return self._query_from_database(table_name, filters, limit)
+                return self._apply_table_schema(
+                    self._query_from_database(table_name, filters, limit, columns), table_name
+                )
         except Exception as e:
             self.logger.error(f"Error querying data from {table_name}: {str(e)}")
             return None
     
+    def save_partitioned(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str = "json",
+                         mode: str = "replace", column: Optional[str] = None,
+                         granularity: Optional[str] = None) -> bool:
+        """按日期分区保存时间序列表
+        
+        文件模式下每个分区为 data/<表名>/<分区键>.<格式> 文件，数据库模式下每个分区为
+        <表名>__p<分区键> 表。分区列和粒度默认取自 DatabaseConfig.TABLE_PARTITIONS。
+        
+        Args:
+            data: 数据
+            table_name: 表名
+            file_format: 分区文件格式（仅文件模式）
+            mode: replace 删除已有全部分区后写入，append 追加到对应分区
+            column: 分区时间列
+            granularity: 分区粒度，day 或 month
+        """
+        try:
+            if mode not in ("replace", "append"):
+                raise ValueError(f"Unsupported write mode for partitioned table: {mode}")
+            self._invalidate_table(table_name)
+            column, granularity = self._partition_spec(table_name, column, granularity)
+            
+            df = self._to_dataframe(data)
+            if column not in df.columns:
+                raise ValueError(f"Partition column {column} not found in data")
+            
+            if mode == "replace":
+                self._drop_partitions(table_name)
+            else:
+                existing = self.list_partitions(table_name)
+                if existing and len(existing[0]) != len(datetime(2000, 1, 1).strftime(self.PARTITION_FORMATS[granularity])):
+                    raise ValueError(f"{table_name} is already partitioned with a different granularity")
+            
+            # 统一为时间类型再写入，仅含日期的文本列（如从CSV读取）与查询的时间范围按同一格式比较
+            df = df.assign(**{column: pd.to_datetime(df[column])})
+            keys = df[column].dt.strftime(self.PARTITION_FORMATS[granularity]).to_numpy()
+            for key, part in df.groupby(keys, sort=True):
+                partition = self._partition_name(table_name, key)
+                if self.use_json:
+                    os.makedirs(os.path.join(self.data_dir, table_name), exist_ok=True)
+                    self._append_to_file(part, partition, file_format)
+                else:
+                    self._ingest_to_database([part], partition, "append")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving partitioned data to {table_name}: {str(e)}")
+            return False
+    
+    def list_partitions(self, table_name: str, file_format: Optional[str] = None) -> List[str]:
+        """列出表的分区键（升序）"""
+        try:
+            if self.use_json:
+                table_dir = os.path.join(self.data_dir, table_name)
+                if not os.path.isdir(table_dir):
+                    return []
+                formats = [file_format] if file_format else self.FILE_FORMATS
+                extensions = tuple(f".{fmt}" for fmt in formats)
+                keys = [f.split('.')[0] for f in os.listdir(table_dir) if f.endswith(extensions)]
+            else:
+                keys = [name[len(table_name) + 3:] for name in self._list_database_partitions(table_name)]
+            return sorted(set(keys))
+        except Exception as e:
+            self.logger.error(f"Error listing partitions of {table_name}: {str(e)}")
+            return []
+    
+    def query_range(self, table_name: str, start: Optional[Any] = None, end: Optional[Any] = None,
+                    filters: Optional[Dict] = None, columns: Optional[List[str]] = None,
+                    file_format: str = "json", column: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """查询分区表在时间范围 [start, end) 内的数据，只读取与范围相交的分区
+        
+        Args:
+            table_name: 表名
+            start: 起始时间（包含），None 表示不限
+            end: 结束时间（不包含），None 表示不限
+            filters: 其他过滤条件，与 query_data 相同
+            columns: 只返回指定的列
+            file_format: 分区文件格式（仅文件模式）
+            column: 分区时间列，默认取自 DatabaseConfig.TABLE_PARTITIONS
+        """
+        try:
+            column, _ = self._partition_spec(table_name, column, None)
+            start = pd.Timestamp(start) if start is not None else None
+            end = pd.Timestamp(end) if end is not None else None
+            
+            partitions = self.list_partitions(table_name, file_format if self.use_json else None)
+            if not partitions:
+                return None
+            
+            frames = []
+            for key in self._prune_partitions(partitions, start, end):
+                partition = self._partition_name(table_name, key)
+                if self.use_json:
+                    frame = self._read_file_partition(table_name, partition, file_format, column, start, end,
+                                                      filters, columns)
+                else:
+                    frame = self._read_database_partition(partition, column, start, end, filters, columns)
+                if frame is not None and len(frame):
+                    frames.append(frame)
+            
+            if not frames:
+                return pd.DataFrame(columns=columns or [])
+            return self._apply_table_schema(pd.concat(frames, ignore_index=True), table_name)
+        except Exception as e:
+            self.logger.error(f"Error querying range from {table_name}: {str(e)}")
+            return None
+    
+    def iter_data(self, table_name: str, chunksize: Optional[int] = None, filters: Optional[Dict] = None,
+                  columns: Optional[List[str]] = None, file_format: str = "json") -> Iterator[pd.DataFrame]:
+        """分块读取数据表，内存占用只与单个数据块大小有关
+        
+        数据库模式使用游标分块读取；文件模式下CSV分块解析，Parquet按记录批次扫描（过滤条件下推），
+        Feather在内存映射的表上切片，JSON逐行解析记录。
+        
+        Args:
+            table_name: 表名
+            chunksize: 每块行数，默认使用 PerformanceConfig.STORAGE_CHUNK_SIZE
+            filters: 过滤条件，与 query_data 相同
+            columns: 只返回指定的列
+            file_format: 文件格式（仅文件模式）
+        """
+        chunksize = chunksize or PerformanceConfig.STORAGE_CHUNK_SIZE
+        try:
+            if self._is_partitioned(table_name):
+                chunks = self._iter_partitions(table_name, chunksize, filters, columns, file_format)
+            elif self.use_json:
+                chunks = self._iter_from_file(table_name, file_format, chunksize, filters, columns)
+            else:
+                chunks = self._iter_from_database(table_name, chunksize, filters, columns)
+            
+            for chunk in chunks:
+                if len(chunk):
+                    yield self._apply_table_schema(chunk, table_name)
+        except Exception as e:
+            self.logger.error(f"Error iterating data from {table_name}: {str(e)}")
+    
+    def aggregate(self, table_name: str, group_by: Optional[Union[str, List[str]]], aggs: Dict[str, Union[str, List[str]]],
+                  filters: Optional[Dict] = None, file_format: str = "json") -> Optional[pd.DataFrame]:
+        """分组聚合，只把聚合结果读入Python
+        
+        数据库模式编译为 SQL GROUP BY；文件模式和分区表通过 iter_data 分块读取，
+        每块先局部聚合再合并，内存占用只与数据块大小和分组数有关。
+        
+        Args:
+            table_name: 表名
+            group_by: 分组列，None 表示对全表聚合
+            aggs: 列名到聚合函数（sum/mean/count/min/max）或函数列表的映射
+            filters: 过滤条件，与 query_data 相同
+            file_format: 文件格式（仅文件模式）
+        
+        Returns:
+            每组一行的DataFrame，分组列之后为 <列名>_<函数> 形式的聚合列，按分组列排序
+        """
+        try:
+            group_by = [group_by] if isinstance(group_by, str) else list(group_by or [])
+            aggs = {column: [funcs] if isinstance(funcs, str) else list(funcs) for column, funcs in aggs.items()}
+            for funcs in aggs.values():
+                unsupported = [func for func in funcs if func not in self.AGG_FUNCTIONS]
+                if unsupported:
+                    raise ValueError(f"Unsupported aggregate functions: {unsupported}")
+            
+            if not self.use_json and not self._is_partitioned(table_name):
+                return self._aggregate_in_database(table_name, group_by, aggs, filters)
+            
+            columns = list(dict.fromkeys(group_by + list(aggs)))
+            chunks = self.iter_data(table_name, filters=filters, columns=columns, file_format=file_format)
+            return self._aggregate_chunks(chunks, group_by, aggs)
+        except Exception as e:
+            self.logger.error(f"Error aggregating data from {table_name}: {str(e)}")
+            return None
+    
+    def bulk_ingest(self, chunks: Iterable[pd.DataFrame], table_name: str, if_exists: str = "replace",
+                    file_format: Optional[str] = None) -> int:
+        """批量导入数据块，逐块写入存储后端，返回写入的行数
+        
+        文件模式下写入Parquet（需要pyarrow）或追加写入CSV，数据库模式下在单个事务内批量插入，
+        内存占用只与单个数据块大小有关。
+        
+        Args:
+            chunks: 数据块迭代器，例如 DataSimulator.iter_chunks 的输出
+            table_name: 表名
+            if_exists: replace 覆盖已有数据，append 追加到已有数据
+            file_format: 文件格式（parquet/feather/csv），默认有pyarrow时使用parquet
+        """
+        if if_exists not in ("replace", "append"):
+            raise ValueError(f"Unsupported if_exists: {if_exists}")
+        
+        try:
+            self._invalidate_table(table_name)
+            if self.use_json:
+                file_format = file_format or ("parquet" if pq is not None else "csv")
+                if file_format == "parquet":
+                    rows = self._ingest_to_parquet(chunks, table_name, if_exists)
+                elif file_format == "feather":
+                    rows = self._ingest_to_feather(chunks, table_name, if_exists)
+                elif file_format == "csv":
+                    rows = self._ingest_to_csv(chunks, table_name, if_exists)
+                else:
+                    raise ValueError(f"Unsupported bulk ingest format: {file_format}")
+            else:
+                rows = self._ingest_to_database(chunks, table_name, if_exists)
+            
+            self.logger.info(f"Bulk ingested {rows} rows into {table_name}")
+            return rows
+        except Exception as e:
+            self.logger.error(f"Error bulk ingesting data into {table_name}: {str(e)}")
+            return 0
+    
+    def load_arrow(self, table_name: str, columns: Optional[List[str]] = None) -> Optional["pa.Table"]:
+        """以内存映射方式零拷贝读取Feather（Arrow IPC）表
+        
+        返回的Arrow表直接引用操作系统页缓存中的文件内容，同一进程内的多个会话
+        或多个工作进程读取同一张表时共享同一份物理内存。
+        """
+        try:
+            return self._read_feather_table(table_name, columns)
+        except Exception as e:
+            self.logger.error(f"Error memory-mapping {table_name}: {str(e)}")
+            return None
+    
+    def suggest_indexes(self, min_count: int = 1, create: bool = False) -> Dict[str, List[List[str]]]:
+        """根据 query_data 观察到的过滤列组合给出数据库索引建议
+        
+        Args:
+            min_count: 过滤列组合至少出现的查询次数
+            create: 是否直接创建建议的索引
+        
+        Returns:
+            表名到建议索引列清单的映射，已有索引覆盖的组合不再建议
+        """
+        suggestions: Dict[str, List[List[str]]] = {}
+        if self.use_json:
+            return suggestions
+        
+        try:
+            with self._get_db_connection() as conn:
+                for table_name, patterns in self._query_patterns.items():
+                    existing = self._database_indexes(conn, table_name)
+                    table_columns = self._database_columns(conn, table_name)
+                    for pattern, count in patterns.most_common():
+                        if count < min_count or not set(pattern) <= table_columns:
+                            continue
+                        if self._index_covers(existing, pattern):
+                            continue
+                        suggestions.setdefault(table_name, []).append(list(pattern))
+                        if create:
+                            self._create_database_index(conn, table_name, list(pattern))
+                            existing.append(list(pattern))
+                if create:
+                    conn.commit()
+        except Exception as e:
+            self.logger.error(f"Error suggesting indexes: {str(e)}")
+        return suggestions
+    
+    def compact_wal(self, table_name: Optional[str] = None) -> int:
+        """将JSON表WAL中的记录合并进主文件，返回合并的记录数
+        
+        Args:
+            table_name: 表名，None 表示所有存在WAL的表（包括分区）
+        """
+        try:
+            if table_name is not None:
+                tables = [table_name]
+            else:
+                tables = []
+                for root, _, filenames in os.walk(self.data_dir):
+                    for filename in filenames:
+                        if filename.endswith('.json.wal'):
+                            relpath = os.path.relpath(os.path.join(root, filename), self.data_dir)
+                            tables.append(relpath[:-len('.json.wal')])
+            return sum(self._compact_table(table) for table in tables)
+        except Exception as e:
+            self.logger.error(f"Error compacting WAL: {str(e)}")
+            return 0
+    
     def list_tables(self) -> List[str]:
         """列出所有表/文件"""
         try:
             if self.use_json:
                 files = os.listdir(self.data_dir)
-                tables = [f.split('.')[0] for f in files if f.endswith('.json') or f.endswith('.csv')]
-                return tables
+                extensions = tuple(f".{file_format}" for file_format in self.FILE_FORMATS)
+                tables = [f.split('.')[0] for f in files if f.endswith(extensions)]
+                # 分区表以目录存储
+                tables += [f for f in files if not f.startswith('_') and os.path.isdir(os.path.join(self.data_dir, f))]
+                return list(dict.fromkeys(tables))
             else:
-                return self._list_database_tables()
+                tables = [name.split('__p')[0] for name in self._list_database_tables()]
+                return list(dict.fromkeys(tables))
         except Exception as e:
             self.logger.error(f"Error listing tables: {str(e)}")
             return []
     
-    def backup_data(self, backup_dir: str) -> bool:
-        """备份数据"""
+    def backup_data(self, backup_dir: str, full: bool = False) -> bool:
+        """增量备份数据
+        
+        backup_dir 下每次备份生成一个以时间命名的快照目录，清单（manifest.json）记录每个文件的
+        内容哈希以及内容实际所在的快照。与上一个快照相比大小和修改时间都未变化的文件直接沿用
+        上次的哈希，内容未变化的文件不再保存。数据库模式下先用SQLite在线备份得到一致的数据库副本，
+        再按固定大小的块（页的整数倍）比较，只保存变化的块。
+        
+        有变化的内容逐个压缩（DatabaseConfig.BACKUP_COMPRESSION，zstd 或 gzip）后写入快照目录下的
+        data.tar，清单记录每个成员数据在归档中的位置，恢复时可以直接定位并并行解压。压缩在线程池中
+        分块流式进行，较大的结果暂存到临时文件，内存占用与表的大小无关。
+        
+        Args:
+            backup_dir: 备份根目录
+            full: 是否忽略已有快照做全量备份
+        """
         try:
             os.makedirs(backup_dir, exist_ok=True)
+            snapshots = self._list_snapshots(backup_dir)
+            parent = None if full or not snapshots else self._read_manifest(os.path.join(backup_dir, snapshots[-1]))
             
-            if self.use_json:
-                # 复制所有JSON和CSV文件
-                import shutil
-                for filename in os.listdir(self.data_dir):
-                    if filename.endswith(('.json', '.csv')):
-                        src = os.path.join(self.data_dir, filename)
-                        dst = os.path.join(backup_dir, filename)
-                        shutil.copy2(src, dst)
-            else:
-                # 导出数据库数据
-                tables = self.list_tables()
-                for table in tables:
-                    data = self.load_data(table)
-                    if data is not None:
-                        backup_file = os.path.join(backup_dir, f"{table}.csv")
-                        if isinstance(data, pd.DataFrame):
-                            data.to_csv(backup_file, index=False)
-                        else:
-                            pd.DataFrame(data).to_csv(backup_file, index=False)
-            
-            self.logger.info(f"Data backup completed to {backup_dir}")
+            name = datetime.now().strftime('%Y%m%d%H%M%S%f')
+            snapshot_dir = os.path.join(backup_dir, name)
+            tmp_dir = f"{snapshot_dir}.tmp"
+            os.makedirs(tmp_dir)
+            codec = self._backup_codec()
+            archive_path = os.path.join(tmp_dir, self.BACKUP_ARCHIVE)
+            
+            try:
+                with tarfile.open(archive_path, 'w', format=tarfile.PAX_FORMAT) as archive:
+                    if self.use_json:
+                        entries = self._backup_files(archive, name, parent, codec)
+                    else:
+                        entries = self._backup_database(archive, tmp_dir, name, parent, codec)
+                    stored = sum(member.size for member in archive.getmembers())
+                
+                copied = [entry for entry in entries.values() if entry["snapshot"] == name]
+                if not copied:
+                    os.remove(archive_path)
+                
+                manifest = {
+                    "snapshot": name,
+                    "parent": parent["snapshot"] if parent else None,
+                    "created_at": datetime.now().isoformat(),
+                    "storage": "files" if self.use_json else "sqlite",
+                    "entries": entries
+                }
+                with open(os.path.join(tmp_dir, self.BACKUP_MANIFEST), 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=2)
+                # 快照目录写完后再改名，未完成的备份不会成为后续增量的基准
+                os.rename(tmp_dir, snapshot_dir)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            
+            self.logger.info(
+                f"Data backup completed to {snapshot_dir}: {len(copied)}/{len(entries)} entries copied, "
+                f"{sum(entry['size'] for entry in copied)} bytes ({stored} bytes stored, {codec})"
+            )
             return True
             
         except Exception as e:
             self.logger.error(f"Error backing up data: {str(e)}")
             return False
     
-    def restore_data(self, backup_dir: str) -> bool:
-        """恢复数据"""
+    def restore_data(self, backup_dir: str, snapshot: Optional[str] = None) -> bool:
+        """恢复数据
+        
+        Args:
+            backup_dir: 备份根目录、单个快照目录，或旧版本备份生成的文件目录
+            snapshot: 要恢复的快照名，默认为最新快照
+        """
         try:
             if not os.path.exists(backup_dir):
                 self.logger.error(f"Backup directory {backup_dir} does not exist")
                 return False
             
-            for filename in os.listdir(backup_dir):
-                if filename.endswith('.csv'):
-                    table_name = filename.replace('.csv', '')
-                    file_path = os.path.join(backup_dir, filename)
-                    data = pd.read_csv(file_path)
-                    self.save_data(data, table_name, "csv")
-                elif filename.endswith('.json'):
-                    table_name = filename.replace('.json', '')
-                    file_path = os.path.join(backup_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    self.save_data(data, table_name, "json")
+            if os.path.exists(os.path.join(backup_dir, self.BACKUP_MANIFEST)):
+                # 直接指定了快照目录
+                snapshot_dir = os.path.abspath(backup_dir)
+                backup_dir, snapshot = os.path.dirname(snapshot_dir), os.path.basename(snapshot_dir)
+            
+            self._clear_table_cache()
+            snapshots = self._list_snapshots(backup_dir)
+            if snapshot is not None or snapshots:
+                manifest = self._read_manifest(os.path.join(backup_dir, snapshot or snapshots[-1]))
+                self._restore_snapshot(backup_dir, manifest)
+            else:
+                self._restore_files(backup_dir)
             
             self.logger.info(f"Data restore completed from {backup_dir}")
             return True
@@ -167,30 +622,1209 @@ class DataStorage:
             self.logger.error(f"Error restoring data: {str(e)}")
             return False
     
+    def _list_snapshots(self, backup_dir: str) -> List[str]:
+        """列出备份根目录下已完成的快照（按时间升序）"""
+        if not os.path.isdir(backup_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(backup_dir)
+            if os.path.exists(os.path.join(backup_dir, name, self.BACKUP_MANIFEST))
+        )
+    
+    def _read_manifest(self, snapshot_dir: str) -> Dict[str, Any]:
+        """读取快照清单"""
+        with open(os.path.join(snapshot_dir, self.BACKUP_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _backup_codec(self) -> str:
+        """备份使用的压缩方式，未安装zstandard时zstd退化为gzip"""
+        codec = DatabaseConfig.BACKUP_COMPRESSION
+        if codec not in self.BACKUP_CODECS:
+            raise ValueError(f"Unsupported backup compression: {codec}")
+        if codec == "zstd" and zstd is None:
+            return "gzip"
+        return codec
+    
+    def _compressor(self, codec: str):
+        """创建流式压缩器，none 返回None"""
+        level = DatabaseConfig.BACKUP_COMPRESSION_LEVEL
+        if codec == "zstd":
+            return zstd.ZstdCompressor(level=level).compressobj()
+        if codec == "gzip":
+            return zlib.compressobj(level, zlib.DEFLATED, 31)
+        return None
+    
+    def _decompressor(self, codec: str):
+        """创建流式解压器，none 返回None"""
+        if codec == "zstd":
+            if zstd is None:
+                raise ImportError("zstandard is required to restore zstd-compressed backups")
+            return zstd.ZstdDecompressor().decompressobj()
+        if codec == "gzip":
+            return zlib.decompressobj(31)
+        return None
+    
+    def _bounded_map(self, func: Callable[[Any], Any], items: Iterable[Any], processes: bool = False) -> Iterator[Any]:
+        """在线程池（或进程池）中按顺序处理，未取走的结果最多为工作者数的两倍，限制内存占用
+        
+        zlib、zstd和哈希计算会释放GIL，适合线程池；JSON解析等受GIL限制的任务使用进程池，
+        此时 func 必须可以被pickle（模块级函数或静态方法）。
+        """
+        max_workers = max(1, PerformanceConfig.MAX_WORKERS)
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _pack_backup_entry(self, blocks: Iterable[bytes], codec: str) -> tuple:
+        """流式压缩一个备份条目，同时计算原始内容的哈希，返回 (哈希, 原始大小, 压缩结果的临时文件)"""
+        digest = hashlib.sha256()
+        compressor = self._compressor(codec)
+        spool = tempfile.SpooledTemporaryFile(max_size=self.BACKUP_SPOOL_BYTES)
+        size = 0
+        try:
+            for block in blocks:
+                digest.update(block)
+                size += len(block)
+                spool.write(compressor.compress(block) if compressor is not None else block)
+            if compressor is not None:
+                spool.write(compressor.flush())
+        except Exception:
+            spool.close()
+            raise
+        return digest.hexdigest(), size, spool
+    
+    def _add_to_archive(self, archive: tarfile.TarFile, relpath: str, spool: BinaryIO, codec: str) -> Dict[str, Any]:
+        """将压缩好的条目写入快照归档，返回成员数据在归档中的位置"""
+        info = tarfile.TarInfo(relpath + self.BACKUP_CODECS[codec])
+        info.size = spool.seek(0, os.SEEK_END)
+        info.mtime = int(datetime.now().timestamp())
+        spool.seek(0)
+        try:
+            archive.addfile(info, spool)
+        finally:
+            spool.close()
+        # 成员数据按512字节块对齐写在成员头之后，addfile 之后 archive.offset 指向数据块的末尾
+        offset = archive.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        return {"archive": self.BACKUP_ARCHIVE, "codec": codec, "offset": offset, "stored_size": info.size}
+    
+    def _pack_backup_file(self, relpath: str, codec: str) -> Optional[tuple]:
+        """在共享锁下读取并压缩数据文件（不会读到其他进程写了一半的CSV或WAL），文件已被删除时返回None"""
+        src = os.path.join(self.data_dir, relpath)
+        lock = nullcontext() if relpath.startswith('_') else self._table_lock(relpath.split('.')[0], shared=True)
+        with lock:
+            if not os.path.exists(src):
+                return None
+            stat = os.stat(src)
+            with open(src, 'rb') as f:
+                digest, size, spool = self._pack_backup_entry(iter(lambda: f.read(self.BACKUP_BLOCK_SIZE), b''), codec)
+        return digest, size, stat.st_mtime_ns, spool
+    
+    def _backup_files(self, archive: tarfile.TarFile, name: str, parent: Optional[Dict[str, Any]],
+                      codec: str) -> Dict[str, Dict[str, Any]]:
+        """备份数据目录下的所有文件（包括分区和索引），只保存内容有变化的文件"""
+        previous = parent["entries"] if parent and parent.get("storage") == "files" else {}
+        entries = {}
+        changed = []
+        
+        for root, _, filenames in os.walk(self.data_dir):
+            for filename in filenames:
+                if filename.endswith(('.tmp', '.lock')):
+                    continue
+                src = os.path.join(root, filename)
+                relpath = os.path.relpath(src, self.data_dir).replace(os.sep, '/')
+                
+                old = previous.get(relpath)
+                if old and os.path.exists(src):
+                    stat = os.stat(src)
+                    if old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                        # 大小和修改时间都未变化，沿用上次的条目，不重新读取文件
+                        entries[relpath] = old
+                        continue
+                changed.append(relpath)
+        
+        packed = self._bounded_map(lambda relpath: self._pack_backup_file(relpath, codec), changed)
+        for relpath, result in zip(changed, packed):
+            if result is None:
+                continue
+            digest, size, mtime_ns, spool = result
+            
+            old = previous.get(relpath)
+            entry = {"sha256": digest, "size": size, "mtime_ns": mtime_ns, "snapshot": name}
+            if old and old["sha256"] == digest:
+                # 内容未变化，沿用内容所在的快照
+                spool.close()
+                entry.update({key: value for key, value in old.items() if key not in ("size", "mtime_ns")})
+            else:
+                entry.update(self._add_to_archive(archive, relpath, spool, codec))
+            entries[relpath] = entry
+        return entries
+    
+    def _backup_database(self, archive: tarfile.TarFile, snapshot_dir: str, name: str,
+                         parent: Optional[Dict[str, Any]], codec: str) -> Dict[str, Dict[str, Any]]:
+        """在线备份SQLite数据库，按块比较，只保存内容有变化的块"""
+        previous = parent["entries"] if parent and parent.get("storage") == "sqlite" else {}
+        copy_path = os.path.join(snapshot_dir, "database.sqlite.tmp")
+        
+        # 在线备份API按页复制，得到一致的副本且页布局不变，未修改的页对应的块哈希不变
+        with self._get_db_connection() as conn:
+            target = sqlite3.connect(copy_path)
+            try:
+                conn.backup(target)
+            finally:
+                target.close()
+        
+        entries = {}
+        try:
+            with open(copy_path, 'rb') as f:
+                packed = self._bounded_map(
+                    lambda item: (item[0],) + self._pack_backup_entry([item[1]], codec),
+                    self._changed_blocks(f, previous, entries)
+                )
+                for relpath, digest, size, spool in packed:
+                    entry = {"sha256": digest, "size": size, "snapshot": name}
+                    entry.update(self._add_to_archive(archive, relpath, spool, codec))
+                    entries[relpath] = entry
+        finally:
+            os.remove(copy_path)
+        return dict(sorted(entries.items()))
+    
+    def _changed_blocks(self, f: BinaryIO, previous: Dict[str, Dict[str, Any]],
+                        entries: Dict[str, Dict[str, Any]]) -> Iterator[tuple]:
+        """逐块读取数据库副本，未变化的块沿用上次的条目，产出有变化的块"""
+        for i, block in enumerate(iter(lambda: f.read(self.BACKUP_BLOCK_SIZE), b'')):
+            relpath = f"sqlite/{i:08d}"
+            old = previous.get(relpath)
+            if old and old["sha256"] == hashlib.sha256(block).hexdigest():
+                entries[relpath] = old
+            else:
+                yield relpath, block
+    
+    def _read_backup_entry(self, backup_dir: str, relpath: str, entry: Dict[str, Any]) -> Iterator[bytes]:
+        """流式读取备份条目的原始内容：压缩条目从归档中的位置边读边解压，旧版本快照直接读取文件"""
+        snapshot_dir = os.path.join(backup_dir, entry["snapshot"])
+        if "archive" not in entry:
+            with open(os.path.join(snapshot_dir, relpath), 'rb') as f:
+                yield from iter(lambda: f.read(self.BACKUP_BLOCK_SIZE), b'')
+            return
+        
+        decompressor = self._decompressor(entry["codec"])
+        with open(os.path.join(snapshot_dir, entry["archive"]), 'rb') as f:
+            f.seek(entry["offset"])
+            remaining = entry["stored_size"]
+            while remaining > 0:
+                block = f.read(min(self.BACKUP_BLOCK_SIZE, remaining))
+                if not block:
+                    raise EOFError(f"Backup archive of snapshot {entry['snapshot']} is truncated at {relpath}")
+                remaining -= len(block)
+                data = decompressor.decompress(block) if decompressor is not None else block
+                if data:
+                    yield data
+        if decompressor is not None and hasattr(decompressor, 'flush'):
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+    
+    def _verify_backup_entry(self, relpath: str, entry: Dict[str, Any], digest: str):
+        """校验恢复出的内容与清单中的哈希一致"""
+        if digest != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch restoring {relpath} from snapshot {entry['snapshot']}")
+    
+    def _restore_backup_file(self, backup_dir: str, relpath: str, entry: Dict[str, Any]) -> int:
+        """解压单个文件到临时文件，校验后恢复修改时间（WAL首行依赖主文件的修改时间）并原子替换，返回字节数"""
+        dst = os.path.join(self.data_dir, relpath)
+        tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            digest = hashlib.sha256()
+            with open(tmp_path, 'wb') as out:
+                for block in self._read_backup_entry(backup_dir, relpath, entry):
+                    digest.update(block)
+                    out.write(block)
+            self._verify_backup_entry(relpath, entry, digest.hexdigest())
+            if "mtime_ns" in entry:
+                os.utime(tmp_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            with nullcontext() if relpath.startswith('_') else self._table_lock(relpath.split('.')[0]):
+                os.replace(tmp_path, dst)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return entry["size"]
+    
+    def _restore_snapshot(self, backup_dir: str, manifest: Dict[str, Any]):
+        """按快照清单恢复，每个条目从内容所在的快照读取，多个条目在线程池中并行解压"""
+        entries = manifest["entries"]
+        missing = [name for name in {entry["snapshot"] for entry in entries.values()}
+                   if not os.path.isdir(os.path.join(backup_dir, name))]
+        if missing:
+            raise FileNotFoundError(f"Backup chain is incomplete, missing snapshots: {missing}")
+        
+        if manifest.get("storage") == "sqlite":
+            self._restore_database_blocks(backup_dir, entries)
+            return
+        
+        # 分区表整体替换，避免残留快照之后删除的分区
+        partitioned = {relpath.split('/')[0] for relpath in entries
+                       if relpath.count('/') == 1 and not relpath.startswith('_')}
+        for table_name in partitioned:
+            self._drop_partitions(table_name)
+        # 当前的WAL可能晚于快照，恢复的表只使用快照中的WAL；快照中没有的表（如备份之后新建的表）保留WAL
+        for relpath in entries:
+            if relpath.endswith('.json'):
+                wal_path = os.path.join(self.data_dir, f"{relpath}.wal")
+                if os.path.exists(wal_path):
+                    os.remove(wal_path)
+        
+        progress = self._restore_progress(len(entries))
+        with ThreadPoolExecutor(max_workers=max(1, PerformanceConfig.MAX_WORKERS)) as executor:
+            sizes = executor.map(lambda item: self._restore_backup_file(backup_dir, *item), entries.items())
+            for relpath, size in zip(entries, sizes):
+                self._log_restore_progress(progress, relpath, size)
+        self._file_indexes.clear()
+    
+    def _restore_database_block(self, fd: int, backup_dir: str, relpath: str, entry: Dict[str, Any]) -> int:
+        """解压单个数据块并写入数据库副本中对应的位置，返回字节数"""
+        data = b''.join(self._read_backup_entry(backup_dir, relpath, entry))
+        self._verify_backup_entry(relpath, entry, hashlib.sha256(data).hexdigest())
+        os.pwrite(fd, data, int(relpath.split('/')[-1]) * self.BACKUP_BLOCK_SIZE)
+        return len(data)
+    
+    def _restore_database_blocks(self, backup_dir: str, entries: Dict[str, Dict[str, Any]]):
+        """并行解压数据块重组数据库副本，再通过在线备份API写回当前数据库"""
+        db_path = self.db_url.replace('sqlite:///', '')
+        copy_path = f"{db_path}.restore.tmp"
+        try:
+            fd = os.open(copy_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            progress = self._restore_progress(len(entries))
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, PerformanceConfig.MAX_WORKERS)) as executor:
+                    sizes = executor.map(
+                        lambda relpath: self._restore_database_block(fd, backup_dir, relpath, entries[relpath]),
+                        sorted(entries)
+                    )
+                    for relpath, size in zip(sorted(entries), sizes):
+                        self._log_restore_progress(progress, relpath, size)
+            finally:
+                os.close(fd)
+            
+            source = sqlite3.connect(copy_path)
+            try:
+                with self._get_db_connection() as conn:
+                    source.backup(conn)
+            finally:
+                source.close()
+        finally:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)
+    
+    def _restore_files(self, backup_dir: str):
+        """从旧版本备份生成的文件目录恢复
+        
+        各表文件在进程池中并行解析，当前进程按文件顺序写入：数据库模式下所有表在同一个连接的单个事务内
+        重建并批量插入，数据全部写入后再建索引；文件模式下逐表写入对应格式的文件。
+        """
+        files = []
+        for filename in sorted(os.listdir(backup_dir)):
+            path = os.path.join(backup_dir, filename)
+            if os.path.isdir(path):
+                # 分区表目录按分区原样恢复
+                if self.use_json:
+                    self._drop_partitions(filename)
+                    shutil.copytree(path, os.path.join(self.data_dir, filename))
+                continue
+            table_name, extension = os.path.splitext(filename)
+            if extension[1:] in self.FILE_FORMATS:
+                # 数据库模式在子进程中直接转换为DataFrame，按列传回比记录字典列表快得多
+                files.append((table_name, extension[1:], path, not self.use_json))
+        
+        # 单核机器上进程池只会增加开销，逐个解析
+        if len(files) > 1 and min(PerformanceConfig.MAX_WORKERS, os.cpu_count() or 1) > 1:
+            parsed = self._bounded_map(DataStorage._read_backup_table, files, processes=True)
+        else:
+            parsed = map(DataStorage._read_backup_table, files)
+        progress = self._restore_progress(len(files), unit="tables")
+        if not self.use_json:
+            self._restore_tables_to_database(files, parsed, progress)
+            return
+        
+        for (table_name, file_format, path, _), data in zip(files, parsed):
+            if file_format in ("parquet", "feather"):
+                self.bulk_ingest([data], table_name, file_format=file_format)
+            else:
+                self.save_data(data, table_name, file_format)
+            rows = len(data) if isinstance(data, (list, pd.DataFrame)) else None
+            self._log_restore_progress(progress, table_name, os.path.getsize(path), rows)
+    
+    @staticmethod
+    def _read_backup_table(item: tuple) -> Union[Dict, List, pd.DataFrame]:
+        """解析备份目录中的单个表文件（在子进程中运行）"""
+        _, file_format, path, as_frame = item
+        if file_format == "json":
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return pd.DataFrame(data) if as_frame else data
+        elif file_format == "csv":
+            return pd.read_csv(path)
+        elif file_format == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_feather(path)
+    
+    def _restore_tables_to_database(self, files: List[tuple], parsed: Iterable[Union[Dict, List, pd.DataFrame]],
+                                    progress: Dict[str, Any]):
+        """在单个事务内重建并写入所有表，全部数据写入后再建索引，避免逐行维护索引"""
+        restored = []
+        with self._get_db_connection() as conn:
+            try:
+                # 显式开启事务：建表和删表语句也在事务内，失败时整体回滚
+                conn.execute("BEGIN")
+                for (table_name, _, path, _), data in zip(files, parsed):
+                    df = self._to_sql_values(self._to_dataframe(data))
+                    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                    conn.execute(self._create_table_sql(table_name, df))
+                    columns = ", ".join(f'"{column}"' for column in df.columns)
+                    placeholders = ", ".join("?" for _ in df.columns)
+                    conn.executemany(
+                        f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})',
+                        # 按列转为Python对象再组装成行，比 itertuples 逐行装箱快
+                        zip(*(df[column].tolist() for column in df.columns))
+                    )
+                    restored.append(table_name)
+                    self._log_restore_progress(progress, table_name, os.path.getsize(path), len(df))
+                
+                for table_name in restored:
+                    self._ensure_database_indexes(conn, table_name)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def _create_table_sql(self, table_name: str, df: pd.DataFrame, if_not_exists: bool = False) -> str:
+        """按DataFrame的列类型生成建表语句（与 pandas.to_sql 的SQLite类型映射一致）"""
+        definitions = []
+        for column, dtype in df.dtypes.items():
+            if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+                sql_type = "INTEGER"
+            elif pd.api.types.is_float_dtype(dtype):
+                sql_type = "REAL"
+            else:
+                sql_type = "TEXT"
+            definitions.append(f'"{column}" {sql_type}')
+        clause = "CREATE TABLE IF NOT EXISTS" if if_not_exists else "CREATE TABLE"
+        return f'{clause} "{table_name}" ({", ".join(definitions)})'
+    
+    def _restore_progress(self, total: int, unit: str = "entries") -> Dict[str, Any]:
+        """创建恢复进度记录"""
+        return {"total": total, "unit": unit, "done": 0, "rows": 0, "bytes": 0, "started": time.monotonic()}
+    
+    def _log_restore_progress(self, progress: Dict[str, Any], name: str, size: int, rows: Optional[int] = None):
+        """累计恢复进度，每完成约10%以及最后一项时记录吞吐量"""
+        progress["done"] += 1
+        progress["bytes"] += size
+        progress["rows"] += rows or 0
+        
+        done, total = progress["done"], progress["total"]
+        if done % max(1, total // 10) and done != total:
+            return
+        
+        elapsed = max(time.monotonic() - progress["started"], 1e-6)
+        message = (f"Restore progress: {done}/{total} {progress['unit']} (last: {name}), "
+                   f"{progress['bytes'] / 2 ** 20:.1f} MiB in {elapsed:.2f}s, "
+                   f"{progress['bytes'] / 2 ** 20 / elapsed:.1f} MiB/s")
+        if progress["rows"]:
+            message += f", {progress['rows']} rows, {progress['rows'] / elapsed:.0f} rows/s"
+        self.logger.info(message)
+    
+    # 数据表缓存
+    def _load_table(self, table_name: str, file_format: str = "json",
+                    columns: Optional[List[str]] = None) -> Optional[Union[Dict, List, pd.DataFrame]]:
+        """加载数据表，优先使用未失效的缓存"""
+        key = (table_name, file_format if self.use_json else None, tuple(columns) if columns else None)
+        # 没有表结构的JSON表按原样返回列表或字典，不缓存，也不计入命中率统计
+        raw_json = (self.use_json and file_format == "json" and not columns and get_schema(table_name) is None
+                    and not self._is_partitioned(table_name))
+        # 先取校验值再加载，加载期间发生的写入会使下次读取缓存时失效
+        validator = self._cache_validator(table_name, file_format) if self.cache_max_bytes > 0 and not raw_json else None
+        
+        if validator is not None:
+            with self._cache_lock:
+                entry = self._table_cache.get(key)
+                if entry is not None and entry[1] == validator:
+                    self._table_cache.move_to_end(key)
+                    self._cache_stats["hits"] += 1
+                    return entry[0].copy()
+                if entry is not None:
+                    self._evict(key)
+                    self._cache_stats["invalidations"] += 1
+                self._cache_stats["misses"] += 1
+        
+        if self._is_partitioned(table_name):
+            data = self.query_range(table_name, columns=columns, file_format=file_format)
+        elif self.use_json:
+            data = self._apply_table_schema(self._load_from_file(table_name, file_format, columns), table_name)
+        else:
+            data = self._apply_table_schema(self._load_from_database(table_name, columns), table_name)
+        
+        # 只缓存DataFrame，返回副本避免调用方修改缓存内容
+        if validator is not None and isinstance(data, pd.DataFrame):
+            self._cache_put(key, data, validator)
+            return data.copy()
+        return data
+    
+    def _cache_validator(self, table_name: str, file_format: str) -> Optional[tuple]:
+        """缓存校验值：写入版本号加上文件的版本号、修改时间和大小（数据库模式为数据库文件及其WAL的修改时间和大小）
+        
+        返回None时不使用缓存。Feather表读取时直接引用内存映射的页，多个会话共享操作系统页缓存，
+        缓存命中时的深拷贝反而更慢，因此不缓存。
+        """
+        version = self._write_versions[table_name]
+        if self.use_json:
+            if file_format == "feather":
+                return None
+            table_dir = os.path.join(self.data_dir, table_name)
+            if os.path.isdir(table_dir):
+                files = sorted(os.scandir(table_dir), key=lambda entry: entry.name)
+                return (version,) + tuple((f.name, f.stat().st_mtime_ns, f.stat().st_size) for f in files)
+            
+            filepath = os.path.join(self.data_dir, f"{table_name}.{file_format}")
+            if not os.path.exists(filepath):
+                return None
+            stat = os.stat(filepath)
+            wal_path = self._wal_path(table_name)
+            wal = os.stat(wal_path) if file_format == "json" and os.path.exists(wal_path) else None
+            # 锁文件中的版本号在其他进程写入后变化，不依赖修改时间的精度
+            return (version, self.get_table_version(table_name), stat.st_mtime_ns, stat.st_size,
+                    wal.st_mtime_ns if wal else None, wal.st_size if wal else None)
+        
+        # 本进程的写入已递增版本号；其他进程提交的写入追加到WAL文件，检查点后写回数据库文件，
+        # 文件状态对所有线程的连接都一致（PRAGMA data_version 只能在同一连接上比较）
+        db_path = self.db_url.replace('sqlite:///', '')
+        validator = (version,)
+        for path in (db_path, f"{db_path}-wal"):
+            try:
+                stat = os.stat(path)
+                validator += (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                validator += (None, None)
+        return validator
+    
+    def _cache_put(self, key: tuple, data: pd.DataFrame, validator: tuple):
+        """写入缓存，超出容量时淘汰最久未使用的表"""
+        size = int(data.memory_usage(index=True, deep=True).sum())
+        if size > self.cache_max_bytes:
+            return
+        
+        with self._cache_lock:
+            self._evict(key)
+            self._table_cache[key] = (data, validator, size)
+            self._cache_bytes += size
+            while self._cache_bytes > self.cache_max_bytes:
+                self._evict(next(iter(self._table_cache)))
+                self._cache_stats["evictions"] += 1
+    
+    def _evict(self, key: tuple):
+        """移除缓存条目（调用方持有锁）"""
+        entry = self._table_cache.pop(key, None)
+        if entry is not None:
+            self._cache_bytes -= entry[2]
+    
+    def _invalidate_table(self, table_name: str):
+        """写入时递增表的版本号并移除该表的缓存"""
+        with self._cache_lock:
+            self._write_versions[table_name] += 1
+            for key in [key for key in self._table_cache if key[0] == table_name]:
+                self._evict(key)
+                self._cache_stats["invalidations"] += 1
+    
+    def _clear_table_cache(self):
+        """清空数据表缓存"""
+        with self._cache_lock:
+            for table_name in {key[0] for key in self._table_cache}:
+                self._write_versions[table_name] += 1
+            self._table_cache.clear()
+            self._cache_bytes = 0
+    
+    def _apply_table_schema(self, data: Optional[Union[Dict, List, pd.DataFrame]],
+                            table_name: str) -> Optional[Union[Dict, List, pd.DataFrame]]:
+        """为已定义结构的表转换为紧凑列类型的DataFrame"""
+        if data is None or get_schema(table_name) is None:
+            return data
+        
+        if isinstance(data, list):
+            data = pd.DataFrame(data)
+        
+        if isinstance(data, pd.DataFrame):
+            return apply_schema(data, table_name)
+        return data
+    
+    def _to_dataframe(self, data: Union[Dict, List, pd.DataFrame]) -> pd.DataFrame:
+        """将记录列表或列字典转换为DataFrame"""
+        return data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    
+    def _is_value_list(self, value: Any) -> bool:
+        """过滤条件的取值是否为多个候选值"""
+        return isinstance(value, (list, tuple, set, frozenset))
+    
+    def _filter_dataframe(self, df: pd.DataFrame, filters: Optional[Dict]) -> pd.DataFrame:
+        """在DataFrame上应用等值过滤条件"""
+        if filters:
+            for column, value in filters.items():
+                if column in df.columns:
+                    if self._is_value_list(value):
+                        df = df[df[column].isin(list(value))]
+                    else:
+                        df = df[df[column] == value]
+        return df
+    
+    # 分区表方法
+    def _partition_spec(self, table_name: str, column: Optional[str], granularity: Optional[str]) -> tuple:
+        """获取分区列和分区粒度"""
+        spec = DatabaseConfig.TABLE_PARTITIONS.get(table_name, {})
+        column = column or spec.get('column')
+        granularity = granularity or spec.get('granularity', 'day')
+        if column is None:
+            raise ValueError(f"No partition column configured for {table_name}")
+        if granularity not in self.PARTITION_FORMATS:
+            raise ValueError(f"Unsupported partition granularity: {granularity}")
+        return column, granularity
+    
+    def _partition_name(self, table_name: str, key: str) -> str:
+        """分区在存储后端中的名称（文件模式为相对路径，数据库模式为表名）"""
+        if self.use_json:
+            return os.path.join(table_name, key)
+        return f"{table_name}__p{key}"
+    
+    def _is_partitioned(self, table_name: str) -> bool:
+        """表是否以分区形式存储"""
+        if self.use_json:
+            return os.path.isdir(os.path.join(self.data_dir, table_name)) and not table_name.startswith('_')
+        return bool(self._list_database_partitions(table_name))
+    
+    def _prune_partitions(self, partitions: List[str], start: Optional[pd.Timestamp],
+                          end: Optional[pd.Timestamp]) -> List[str]:
+        """按时间范围筛选分区；分区键定长，可以按字符串比较"""
+        granularity = "day" if len(partitions[0]) == 8 else "month"
+        fmt = self.PARTITION_FORMATS[granularity]
+        low = start.strftime(fmt) if start is not None else None
+        high = (end - pd.Timedelta(1, 'ns')).strftime(fmt) if end is not None else None
+        return [key for key in partitions
+                if (low is None or key >= low) and (high is None or key <= high)]
+    
+    def _range_mask(self, values: pd.Series, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> pd.Series:
+        """时间范围 [start, end) 的行掩码"""
+        values = pd.to_datetime(values)
+        mask = pd.Series(True, index=values.index)
+        if start is not None:
+            mask &= values >= start
+        if end is not None:
+            mask &= values < end
+        return mask
+    
+    def _read_file_partition(self, table_name: str, partition: str, file_format: str, column: str,
+                             start: Optional[pd.Timestamp], end: Optional[pd.Timestamp],
+                             filters: Optional[Dict], columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
+        """读取单个分区文件并按时间范围和过滤条件筛选"""
+        read_columns = list(dict.fromkeys(list(columns) + [column] + list(filters or {}))) if columns else None
+        data = self._load_from_file(partition, file_format, read_columns)
+        if data is None:
+            return None
+        
+        df = apply_schema(self._to_dataframe(data), table_name)
+        if start is not None or end is not None:
+            df = df[self._range_mask(df[column], start, end)]
+        df = self._filter_dataframe(df, filters)
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+    
+    def _read_database_partition(self, partition: str, column: str, start: Optional[pd.Timestamp],
+                                 end: Optional[pd.Timestamp], filters: Optional[Dict],
+                                 columns: Optional[List[str]]) -> pd.DataFrame:
+        """在数据库中查询单个分区表，时间范围条件下推到SQL"""
+        query, params = self._build_select(partition, filters, columns=columns)
+        conditions = []
+        if start is not None:
+            conditions.append(f'"{column}" >= ?')
+            params.append(self._sql_timestamp(start))
+        if end is not None:
+            conditions.append(f'"{column}" < ?')
+            params.append(self._sql_timestamp(end))
+        if conditions:
+            query += (" AND " if filters else " WHERE ") + " AND ".join(conditions)
+        
+        with self._get_db_connection() as conn:
+            return pd.read_sql_query(query, conn, params=params if params else None)
+    
+    def _iter_partitions(self, table_name: str, chunksize: int, filters: Optional[Dict], columns: Optional[List[str]],
+                         file_format: str) -> Iterator[pd.DataFrame]:
+        """逐个分区分块读取分区表"""
+        column, _ = self._partition_spec(table_name, None, None)
+        for key in self.list_partitions(table_name, file_format if self.use_json else None):
+            partition = self._partition_name(table_name, key)
+            if self.use_json:
+                frame = self._read_file_partition(table_name, partition, file_format, column, None, None,
+                                                  filters, columns)
+            else:
+                frame = self._read_database_partition(partition, column, None, None, filters, columns)
+            if frame is None:
+                continue
+            for start in range(0, len(frame), chunksize):
+                yield frame.iloc[start:start + chunksize]
+    
+    def _drop_partitions(self, table_name: str):
+        """删除表的全部分区"""
+        if self.use_json:
+            for directory in (os.path.join(self.data_dir, table_name), os.path.join(self.index_dir, table_name)):
+                if os.path.isdir(directory):
+                    shutil.rmtree(directory)
+        else:
+            partitions = self._list_database_partitions(table_name)
+            with self._get_db_connection() as conn:
+                in_transaction = conn.in_transaction
+                for partition in partitions:
+                    conn.execute(f'DROP TABLE IF EXISTS "{partition}"')
+                if not in_transaction:
+                    conn.commit()
+    
     # JSON文件存储方法
     def _save_to_file(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str) -> bool:
-        """保存数据到文件"""
+        """保存数据到文件
+        
+        先写入同目录下的临时文件再原子替换，读取方不会看到写了一半的文件，
+        写入过程中崩溃时原文件保持不变。
+        """
         filename = f"{table_name}.{file_format}"
         filepath = os.path.join(self.data_dir, filename)
+        tmp_path = f"{filepath}.tmp"
         
-        if file_format == "json":
-            if isinstance(data, pd.DataFrame):
-                data_dict = data.to_dict('records')
-            else:
-                data_dict = data
+        with self._table_lock(table_name):
+            if file_format == "json":
+                if isinstance(data, (pd.DataFrame, list)):
+                    self._write_json_records(filepath, table_name, data)
+                else:
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+                    self._replace_file(tmp_path, filepath)
+                    self._drop_file_index(table_name)
+                # 覆盖写入取代了WAL中尚未合并的记录
+                self._remove_wal(table_name)
+            
+            elif file_format == "csv":
+                self._to_dataframe(data).to_csv(tmp_path, index=False, encoding='utf-8')
+                self._replace_file(tmp_path, filepath)
+            
+            elif file_format == "parquet":
+                if pq is None:
+                    raise ImportError("pyarrow is required for parquet storage")
+                self._to_dataframe(data).to_parquet(tmp_path, index=False)
+                self._replace_file(tmp_path, filepath)
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data_dict, f, ensure_ascii=False, indent=2, default=str)
+            elif file_format == "feather":
+                self._ingest_to_feather([self._to_dataframe(data)], table_name, "replace")
+            
+            else:
+                raise ValueError(f"Unsupported file format: {file_format}")
         
-        elif file_format == "csv":
-            if isinstance(data, pd.DataFrame):
-                data.to_csv(filepath, index=False, encoding='utf-8')
+        return True
+    
+    def _replace_file(self, tmp_path: str, filepath: str):
+        """用写好的临时文件原子替换目标文件"""
+        if DatabaseConfig.FSYNC_WRITES:
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    
+    @contextmanager
+    def _table_lock(self, table_name: str, shared: bool = False, expected_version: Optional[int] = None):
+        """持有表锁：写入时持有进程内锁和跨进程排他锁，读取时只持有跨进程共享锁，不同进程和线程可同时读取
+        
+        需要同时持有进程内锁的读取方应先获取进程内锁，与写入方的加锁顺序一致。
+        """
+        file_lock = self._file_lock(table_name)
+        if shared:
+            with file_lock.shared():
+                yield
+        else:
+            with self._thread_lock(table_name), file_lock.exclusive(expected_version):
+                yield
+    
+    def _thread_lock(self, table_name: str) -> threading.RLock:
+        """获取表的进程内锁"""
+        with self._locks_guard:
+            lock = self._table_locks.get(table_name)
+            if lock is None:
+                lock = self._table_locks[table_name] = threading.RLock()
+            return lock
+    
+    def _file_lock(self, table_name: str) -> FileLock:
+        """获取表的跨进程读写锁"""
+        with self._locks_guard:
+            lock = self._file_locks.get(table_name)
+            if lock is None:
+                lock = self._file_locks[table_name] = FileLock(os.path.join(self.lock_dir, f"{table_name}.lock"))
+            return lock
+    
+    def _append_to_file(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str) -> bool:
+        """追加记录到文件，只写入新增部分"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.{file_format}")
+        if not os.path.exists(filepath):
+            return self._save_to_file(data, table_name, file_format)
+        
+        df = self._to_dataframe(data)
+        if df.empty:
+            return True
+        
+        with self._table_lock(table_name):
+            if file_format == "json":
+                # 追加写入WAL，主文件和索引保持不变，由后台合并
+                wal_size = self._append_to_wal(table_name, self._encode_json_records(df.to_dict('records')))
+                if wal_size >= DatabaseConfig.JSON_WAL_COMPACT_BYTES:
+                    self._schedule_compaction(table_name)
+            
+            elif file_format == "csv":
+                # 按已有表头对齐列顺序
+                header = pd.read_csv(filepath, nrows=0, encoding='utf-8').columns
+                df.reindex(columns=header).to_csv(filepath, mode='a', header=False, index=False, encoding='utf-8')
+            
+            elif file_format == "parquet":
+                # Parquet不支持原地追加，追加的数据作为新行组写入（已有行组按原样复制，不重新编码）
+                self._ingest_to_parquet([df], table_name, "append")
+            
+            elif file_format == "feather":
+                self._ingest_to_feather([df], table_name, "append")
+            
             else:
-                pd.DataFrame(data).to_csv(filepath, index=False, encoding='utf-8')
+                raise ValueError(f"Unsupported file format for append: {file_format}")
         
         return True
     
-    def _load_from_file(self, table_name: str, file_format: str) -> Optional[Union[Dict, pd.DataFrame]]:
+    def _encode_json_records(self, records: List[Any]) -> List[bytes]:
+        """将记录逐条编码为单行JSON"""
+        return [json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') for record in records]
+    
+    def _line_offsets(self, lines: List[bytes], start: int) -> np.ndarray:
+        """计算以 ",\n" 分隔的各行记录在文件中的起止字节位置"""
+        lengths = np.fromiter((len(line) for line in lines), dtype=np.int64, count=len(lines))
+        starts = start + np.concatenate(([0], np.cumsum(lengths + 2)[:-1])).astype(np.int64)
+        return np.column_stack((starts, starts + lengths))
+    
+    def _write_json_records(self, filepath: str, table_name: str, data: Union[List, pd.DataFrame]):
+        """以每行一条记录的JSON数组格式写入文件，并重建该表的二级索引"""
+        records = data.to_dict('records') if isinstance(data, pd.DataFrame) else data
+        lines = self._encode_json_records(records)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b'[\n' + b',\n'.join(lines) + b'\n]')
+        self._replace_file(tmp_path, filepath)
+        
+        if self.table_indexes.get(table_name):
+            self._write_file_index(table_name, self._to_dataframe(data), self._line_offsets(lines, 2))
+        else:
+            self._drop_file_index(table_name)
+    
+    # JSON表的WAL：<表名>.json.wal，首行记录创建时主文件的大小和修改时间，之后每行一条记录。
+    # 主文件被合并或覆盖后与首行不再一致，此时WAL中的记录已包含在主文件中或已被取代，读取时忽略
+    def _wal_path(self, table_name: str) -> str:
+        """获取WAL文件路径"""
+        return os.path.join(self.data_dir, f"{table_name}.json.wal")
+    
+    def _wal_header(self, filepath: str) -> Dict[str, int]:
+        """由主文件状态生成WAL首行"""
+        stat = os.stat(filepath)
+        return {"base_size": stat.st_size, "base_mtime_ns": stat.st_mtime_ns}
+    
+    def _read_wal_lines(self, table_name: str) -> List[bytes]:
+        """读取WAL中完整写入的记录行（调用方持有表锁）"""
+        wal_path = self._wal_path(table_name)
+        filepath = os.path.join(self.data_dir, f"{table_name}.json")
+        if not os.path.exists(wal_path) or not os.path.exists(filepath):
+            return []
+        
+        with open(wal_path, 'rb') as f:
+            # 最后一段没有换行符时是崩溃时未写完的记录，丢弃
+            lines = f.read().split(b'\n')[:-1]
+        if not lines or json.loads(lines[0]) != self._wal_header(filepath):
+            return []
+        return [line for line in lines[1:] if line]
+    
+    def _read_wal_records(self, table_name: str) -> List[Any]:
+        """读取WAL中的记录（调用方持有表锁）"""
+        return [json.loads(line) for line in self._read_wal_lines(table_name)]
+    
+    def _append_to_wal(self, table_name: str, lines: List[bytes]) -> int:
+        """追加记录到WAL，返回WAL的大小"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.json")
+        wal_path = self._wal_path(table_name)
+        
+        with self._table_lock(table_name):
+            with open(filepath, 'rb') as f:
+                if f.read(64).lstrip()[:1] != b'[':
+                    raise ValueError(f"{filepath} is not a JSON array")
+            
+            header = self._wal_header(filepath)
+            current = False
+            if os.path.exists(wal_path):
+                with open(wal_path, 'rb') as f:
+                    first = f.readline()
+                current = first.endswith(b'\n') and json.loads(first) == header
+            
+            if not current:
+                # 不存在或已过期的WAL，重新创建
+                with open(wal_path, 'wb') as f:
+                    f.write(json.dumps(header).encode('utf-8') + b'\n')
+            else:
+                self._repair_wal_tail(wal_path)
+            
+            with open(wal_path, 'ab') as f:
+                f.write(b''.join(line + b'\n' for line in lines))
+                f.flush()
+                if DatabaseConfig.FSYNC_WRITES:
+                    os.fsync(f.fileno())
+                return f.tell()
+    
+    def _repair_wal_tail(self, wal_path: str):
+        """截掉崩溃时写了一半的最后一行，避免与新追加的记录连在一起"""
+        with open(wal_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b'\n') + 1)
+    
+    def _remove_wal(self, table_name: str):
+        """删除表的WAL"""
+        wal_path = self._wal_path(table_name)
+        if os.path.exists(wal_path):
+            os.remove(wal_path)
+    
+    def _schedule_compaction(self, table_name: str):
+        """在后台线程中合并WAL，同一张表同时只有一个合并任务"""
+        with self._locks_guard:
+            if table_name in self._compacting:
+                return
+            self._compacting.add(table_name)
+        
+        thread = threading.Thread(target=self._compact_in_background, args=(table_name,),
+                                  name=f"wal-compaction-{table_name}", daemon=True)
+        thread.start()
+    
+    def _compact_in_background(self, table_name: str):
+        """后台合并任务"""
+        try:
+            self._compact_table(table_name)
+        except Exception as e:
+            self.logger.error(f"Error compacting WAL of {table_name}: {str(e)}")
+        finally:
+            with self._locks_guard:
+                self._compacting.discard(table_name)
+    
+    def _compact_table(self, table_name: str) -> int:
+        """将WAL合并进主文件：在主文件的副本末尾追加记录后原子替换，再增量更新索引并删除WAL"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.json")
+        with self._table_lock(table_name):
+            if not os.path.exists(self._wal_path(table_name)):
+                return 0
+            
+            lines = self._read_wal_lines(table_name)
+            if lines:
+                indexed = self._file_index_matches(table_name, filepath)
+                tmp_path = f"{filepath}.tmp"
+                shutil.copyfile(filepath, tmp_path)
+                offsets = self._append_json_records(tmp_path, lines)
+                self._replace_file(tmp_path, filepath)
+                
+                if indexed:
+                    df = pd.DataFrame([json.loads(line) for line in lines])
+                    self._write_file_index(table_name, df, offsets, append=True)
+                else:
+                    self._drop_file_index(table_name)
+            
+            # 主文件已替换，即使在删除前崩溃，过期的WAL也会在读取时被忽略
+            self._remove_wal(table_name)
+        
+        if lines:
+            self.logger.info(f"Compacted {len(lines)} WAL records into {table_name}")
+        return len(lines)
+    
+    def _append_json_records(self, filepath: str, lines: List[bytes]) -> np.ndarray:
+        """在JSON数组文件末尾的 ] 之前原地写入新记录，不重写已有内容，返回新记录的字节位置"""
+        with open(filepath, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            
+            # 从文件末尾向前查找结尾的 ] 以及它之前的最后一个非空白字符
+            tail_size = min(size, 4096)
+            f.seek(size - tail_size)
+            tail = f.read(tail_size)
+            stripped = tail.rstrip()
+            if not stripped.endswith(b']'):
+                raise ValueError(f"{filepath} is not a JSON array")
+            close_pos = len(stripped) - 1
+            prefix = tail[:close_pos].rstrip()
+            
+            if prefix.endswith(b'['):
+                separator = b'\n'
+            else:
+                separator = b',\n'
+            
+            start = size - tail_size + len(prefix)
+            f.seek(start)
+            f.truncate()
+            f.write(separator + b',\n'.join(lines) + b'\n]')
+        
+        return self._line_offsets(lines, start + len(separator))
+    
+    # JSON文件的二级索引：offsets 文件按行号顺序记录每条记录的字节起止位置（int64），
+    # postings 文件首行为表头，之后每次写入追加一行“列 -> 取值 -> 行号列表”的倒排表
+    def _index_paths(self, table_name: str) -> tuple:
+        """获取索引文件路径"""
+        return (os.path.join(self.index_dir, f"{table_name}.offsets"),
+                os.path.join(self.index_dir, f"{table_name}.postings"))
+    
+    def _index_key(self, value: Any, is_datetime: bool = False) -> str:
+        """将列取值规范化为索引键，使写入的值和查询条件的值可以直接比较"""
+        if is_datetime or isinstance(value, (datetime, np.datetime64)):
+            try:
+                value = pd.Timestamp(value).isoformat()
+            except (ValueError, TypeError):
+                pass
+        elif isinstance(value, np.generic):
+            value = value.item()
+        
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return json.dumps(value, ensure_ascii=False, default=str)
+    
+    def _build_postings(self, df: pd.DataFrame, columns: Dict[str, str], first_row: int) -> Dict[str, Dict[str, List[int]]]:
+        """构建数据块的倒排表：列 -> 索引键 -> 行号列表（升序）"""
+        postings = {}
+        for column, kind in columns.items():
+            if column not in df.columns:
+                continue
+            
+            codes, uniques = pd.factorize(df[column])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            
+            entries: Dict[str, List[int]] = {}
+            merged = False
+            for i, value in enumerate(uniques):
+                rows = (order[bounds[i]:bounds[i + 1]] + first_row).tolist()
+                key = self._index_key(value, kind == "datetime")
+                if key in entries:
+                    entries[key].extend(rows)
+                    merged = True
+                else:
+                    entries[key] = rows
+            
+            if merged:
+                entries = {key: sorted(rows) for key, rows in entries.items()}
+            postings[column] = entries
+        return postings
+    
+    def _write_file_index(self, table_name: str, df: pd.DataFrame, offsets: np.ndarray, append: bool = False):
+        """写入或追加表的二级索引"""
+        offsets_path, postings_path = self._index_paths(table_name)
+        
+        if append:
+            with open(postings_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+            first_row = os.path.getsize(offsets_path) // 16
+        else:
+            os.makedirs(os.path.dirname(offsets_path), exist_ok=True)
+            columns = {}
+            for column in self.table_indexes.get(table_name, []):
+                if column in df.columns:
+                    schema_type = (get_schema(table_name) or {}).get(column, "")
+                    is_datetime = schema_type.startswith("datetime64") or pd.api.types.is_datetime64_any_dtype(df[column])
+                    columns[column] = "datetime" if is_datetime else "value"
+            header = {"generation": uuid.uuid4().hex, "columns": columns}
+            
+            with open(offsets_path, 'wb'):
+                pass
+            with open(postings_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n')
+            first_row = 0
+        
+        # 先写倒排表再写记录位置：offsets 与JSON文件大小一致是索引可用的判据，
+        # 在两次写入之间崩溃时 offsets 尚未更新，索引被判定为过期，不会漏掉倒排表中缺失的行
+        postings = self._build_postings(df, header["columns"], first_row)
+        with open(postings_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"postings": postings}, ensure_ascii=False) + '\n')
+        with open(offsets_path, 'ab') as f:
+            f.write(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    
+    def _drop_file_index(self, table_name: str):
+        """删除表的二级索引"""
+        self._file_indexes.pop(table_name, None)
+        for path in self._index_paths(table_name):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _read_index_offsets(self, table_name: str) -> np.ndarray:
+        """内存映射读取记录位置，查询只访问匹配行所在的页"""
+        offsets_path, _ = self._index_paths(table_name)
+        if os.path.getsize(offsets_path) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        return np.memmap(offsets_path, dtype=np.int64, mode='r').reshape(-1, 2)
+    
+    def _file_index_matches(self, table_name: str, filepath: str) -> bool:
+        """检查索引是否与JSON文件一致（最后一条记录之后只剩结尾的 "\n]"）"""
+        offsets_path, postings_path = self._index_paths(table_name)
+        if not (os.path.exists(offsets_path) and os.path.exists(postings_path)):
+            return False
+        
+        offsets = self._read_index_offsets(table_name)
+        expected_size = int(offsets[-1, 1]) + 2 if len(offsets) else 4
+        return expected_size == os.path.getsize(filepath)
+    
+    def _load_file_index(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """读取表的倒排表，已缓存时只读取新追加的部分"""
+        _, postings_path = self._index_paths(table_name)
+        if not os.path.exists(postings_path):
+            self._file_indexes.pop(table_name, None)
+            return None
+        
+        cached = self._file_indexes.get(table_name)
+        with open(postings_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if cached is None or cached["generation"] != header["generation"]:
+                # 表被整体重写，重新读取全部倒排表
+                cached = {
+                    "generation": header["generation"],
+                    "columns": header["columns"],
+                    "postings": {column: {} for column in header["columns"]},
+                    "position": f.tell()
+                }
+            
+            f.seek(cached["position"])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 写入中的倒排表，下次查询再读取
+                segment = json.loads(line)
+                for column, entries in segment["postings"].items():
+                    target = cached["postings"][column]
+                    for key, rows in entries.items():
+                        target.setdefault(key, []).append(np.asarray(rows, dtype=np.int64))
+                cached["position"] += len(line)
+        
+        self._file_indexes[table_name] = cached
+        return cached
+    
+    def _index_lookup(self, index: Dict[str, Any], column: str, value: Any) -> np.ndarray:
+        """查找匹配取值的行号（升序）"""
+        is_datetime = index["columns"][column] == "datetime"
+        values = value if self._is_value_list(value) else [value]
+        
+        parts = []
+        for item in values:
+            parts.extend(index["postings"][column].get(self._index_key(item, is_datetime), []))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(parts)
+        return np.unique(rows) if len(values) > 1 else rows
+    
+    def _query_from_json_index(self, table_name: str, filters: Dict, limit: Optional[int] = None,
+                               columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """通过二级索引查询JSON表，只读取和解析匹配的记录；无法使用索引时返回None"""
+        # 进程内锁保护缓存的倒排表的增量读取
+        with self._thread_lock(table_name), self._table_lock(table_name, shared=True):
+            return self._query_json_index_locked(table_name, filters, limit, columns)
+    
+    def _query_json_index_locked(self, table_name: str, filters: Dict, limit: Optional[int] = None,
+                                 columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """索引查询（调用方持有表锁），WAL中尚未合并的记录另行过滤后追加在结果之后"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.json")
+        if not os.path.exists(filepath) or not self._file_index_matches(table_name, filepath):
+            return None
+        
+        index = self._load_file_index(table_name)
+        indexed = [column for column in filters if index is not None and column in index["columns"]]
+        if not indexed:
+            return None
+        
+        rows = None
+        for column in indexed:
+            matched = self._index_lookup(index, column, filters[column])
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        
+        remaining = {column: value for column, value in filters.items() if column not in indexed}
+        if limit and not remaining:
+            rows = rows[:limit]
+        
+        offsets = self._read_index_offsets(table_name)
+        records = []
+        with open(filepath, 'rb') as f:
+            # 没有匹配行时读取第一条记录以确定列名
+            for start, end in offsets[rows] if len(rows) else offsets[:1]:
+                f.seek(start)
+                records.append(json.loads(f.read(end - start)))
+        
+        if len(rows):
+            df = pd.DataFrame(records)
+        else:
+            df = pd.DataFrame(columns=list(records[0].keys()) if records else [])
+        
+        wal_records = self._read_wal_records(table_name)
+        if wal_records:
+            # WAL中的时间列仍是字符串，索引列按与倒排表相同的规范化键匹配，其余条件在转换列类型后统一过滤
+            wal_df = pd.DataFrame(wal_records)
+            mask = np.ones(len(wal_df), dtype=bool)
+            for column in indexed:
+                is_datetime = index["columns"][column] == "datetime"
+                values = filters[column] if self._is_value_list(filters[column]) else [filters[column]]
+                keys = {self._index_key(item, is_datetime) for item in values}
+                if column in wal_df.columns:
+                    mask &= wal_df[column].map(lambda value: self._index_key(value, is_datetime)).isin(keys).to_numpy()
+                else:
+                    mask[:] = False
+            wal_df = wal_df[mask]
+            if len(wal_df):
+                df = pd.concat([df, wal_df], ignore_index=True) if len(df) else wal_df.reset_index(drop=True)
+        
+        df = self._filter_dataframe(self._apply_table_schema(df, table_name), remaining)
+        if limit:
+            df = df.head(limit)
+        if columns:
+            df = df[[column for column in columns if column in df.columns]]
+        return df
+    
+    def _upsert_to_file(self, data: Union[Dict, pd.DataFrame], table_name: str, file_format: str,
+                        key: List[str]) -> bool:
+        """按主键更新或插入记录
+        
+        行式文件无法按主键定位记录，因此需要读取已有数据、合并后整体重写；
+        只追加新记录的场景应使用 append 模式。
+        """
+        df = self._apply_table_schema(self._to_dataframe(data), table_name)
+        with self._table_lock(table_name):
+            existing = self._load_from_file(table_name, file_format)
+            if existing is not None:
+                # JSON/CSV中的时间列读出为字符串，按表结构转换并统一主键列类型后才能与新记录比较
+                existing = self._to_dataframe(self._apply_table_schema(existing, table_name))
+                for column in key:
+                    if column in existing.columns and column in df.columns and (
+                            pd.api.types.is_datetime64_any_dtype(existing[column])
+                            or pd.api.types.is_datetime64_any_dtype(df[column])):
+                        existing[column] = pd.to_datetime(existing[column])
+                        df[column] = pd.to_datetime(df[column])
+                
+                # 已有记录保持原有位置，取值以最新写入为准
+                combined = pd.concat([existing, df], ignore_index=True)
+                latest = combined.drop_duplicates(subset=key, keep='last')
+                order = combined.drop_duplicates(subset=key, keep='first')[key]
+                df = order.merge(latest, on=key, how='left')
+            return self._save_to_file(df, table_name, file_format)
+    
+    def _load_from_file(self, table_name: str, file_format: str,
+                        columns: Optional[List[str]] = None) -> Optional[Union[Dict, pd.DataFrame]]:
         """从文件加载数据"""
         filename = f"{table_name}.{file_format}"
         filepath = os.path.join(self.data_dir, filename)
@@ -198,23 +1832,402 @@ class DataStorage:
         if not os.path.exists(filepath):
             return None
         
+        with self._table_lock(table_name, shared=True):
+            if file_format == "json":
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                wal_records = self._read_wal_records(table_name)
+                if wal_records and isinstance(data, list):
+                    data = data + wal_records
+                if columns:
+                    df = self._to_dataframe(data)
+                    return df[[column for column in columns if column in df.columns]]
+                return data
+            
+            elif file_format == "csv":
+                return pd.read_csv(filepath, encoding='utf-8', usecols=columns)
+            
+            elif file_format == "parquet":
+                # 列式存储：只读取需要的列
+                return pd.read_parquet(filepath, columns=columns)
+            
+            elif file_format == "feather":
+                # split_blocks避免合并内存块，无空值的数值列可直接引用内存映射的缓冲区
+                return self._read_feather_table(table_name, columns).to_pandas(split_blocks=True)
+        
+        return None
+    
+    def _read_feather_table(self, table_name: str, columns: Optional[List[str]] = None) -> Optional["pa.Table"]:
+        """内存映射读取Feather文件"""
+        if pa is None:
+            raise ImportError("pyarrow is required for feather storage")
+        
+        filepath = os.path.join(self.data_dir, f"{table_name}.feather")
+        if not os.path.exists(filepath):
+            return None
+        
+        source = pa.memory_map(filepath, 'r')
+        table = pa.ipc.open_file(source).read_all()
+        if columns:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table
+    
+    def _query_from_feather(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                            columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """在内存映射的Arrow表上过滤，只物化匹配的行和需要的列"""
+        table = self._read_feather_table(table_name)
+        if table is None:
+            return None
+        
+        if filters:
+            mask = None
+            for column, value in self._arrow_filters(table.schema, filters).items():
+                if column not in table.column_names:
+                    continue
+                if self._is_value_list(value):
+                    condition = pc.is_in(table[column], value_set=pa.array(list(value)))
+                else:
+                    condition = pc.equal(table[column], pa.scalar(value))
+                mask = condition if mask is None else pc.and_(mask, condition)
+            if mask is not None:
+                table = table.filter(mask)
+        
+        if columns:
+            table = table.select([column for column in columns if column in table.column_names])
+        if limit:
+            table = table.slice(0, limit)
+        return table.to_pandas()
+    
+    def _arrow_filters(self, schema: "pa.Schema", filters: Dict) -> Dict:
+        """将过滤条件的取值转换为Arrow列的类型（如字符串形式的时间条件用于时间戳列），无法转换时保持原值"""
+        converted = {}
+        for column, value in filters.items():
+            if column not in schema.names:
+                converted[column] = value
+                continue
+            
+            field_type = schema.field(column).type
+            if pa.types.is_dictionary(field_type):
+                field_type = field_type.value_type
+            values = list(value) if self._is_value_list(value) else [value]
+            try:
+                scalars = [self._arrow_scalar(item, field_type) for item in values]
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError, TypeError):
+                scalars = values
+            converted[column] = scalars if self._is_value_list(value) else scalars[0]
+        return converted
+    
+    def _arrow_scalar(self, value: Any, field_type: "pa.DataType") -> "pa.Scalar":
+        """转换单个过滤取值"""
+        if value is not None and (pa.types.is_timestamp(field_type) or pa.types.is_date(field_type)):
+            value = pd.Timestamp(value)
+        return pa.scalar(value).cast(field_type)
+    
+    def _query_from_parquet(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                            columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """查询Parquet文件，过滤条件下推到行组统计信息，跳过不含匹配行的行组"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.parquet")
+        if not os.path.exists(filepath):
+            return None
+        
+        if pq is None:
+            raise ImportError("pyarrow is required for parquet storage")
+        
+        parquet_filters = [
+            (column, 'in', list(value)) if self._is_value_list(value) else (column, '==', value)
+            for column, value in self._arrow_filters(pq.read_schema(filepath), filters).items()
+        ] if filters else None
+        table = pq.read_table(filepath, columns=columns, filters=parquet_filters)
+        if limit:
+            table = table.slice(0, limit)
+        return table.to_pandas()
+    
+    def _iter_from_file(self, table_name: str, file_format: str, chunksize: int, filters: Optional[Dict] = None,
+                        columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """分块读取文件"""
+        filepath = os.path.join(self.data_dir, f"{table_name}.{file_format}")
+        if not os.path.exists(filepath):
+            return
+        
+        # 过滤列也需要读取，过滤后再只保留请求的列
+        read_columns = list(dict.fromkeys(list(columns) + list(filters or {}))) if columns else None
+        
         if file_format == "json":
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            if filters:
+                # 按索引列过滤时结果通常很小，直接通过索引读取
+                df = self._query_from_json_index(table_name, filters, columns=columns)
+                if df is not None:
+                    for start in range(0, len(df), chunksize):
+                        yield df.iloc[start:start + chunksize]
+                    return
+            # 打开主文件并读取WAL时持有共享锁；之后合并替换主文件不影响已打开的文件
+            with self._table_lock(table_name, shared=True):
+                handle = open(filepath, 'rb')
+                wal_records = self._read_wal_records(table_name)
+            chunks = (pd.DataFrame(records) for records in self._iter_json_records(handle, chunksize, wal_records))
         
         elif file_format == "csv":
-            return pd.read_csv(filepath, encoding='utf-8')
+            chunks = pd.read_csv(filepath, encoding='utf-8', usecols=read_columns, chunksize=chunksize)
         
-        return None
+        elif file_format == "parquet":
+            if ds is None:
+                raise ImportError("pyarrow is required for parquet storage")
+            dataset = ds.dataset(filepath, format="parquet")
+            expression = None
+            for column, value in self._arrow_filters(dataset.schema, filters or {}).items():
+                condition = ds.field(column).isin(list(value)) if self._is_value_list(value) else ds.field(column) == value
+                expression = condition if expression is None else expression & condition
+            # 过滤条件下推到扫描，跳过不含匹配行的行组
+            batches = dataset.to_batches(columns=columns, filter=expression, batch_size=chunksize)
+            for batch in batches:
+                yield batch.to_pandas()
+            return
+        
+        elif file_format == "feather":
+            table = self._read_feather_table(table_name, read_columns)
+            chunks = (table.slice(start, chunksize).to_pandas() for start in range(0, table.num_rows, chunksize))
+        
+        else:
+            raise ValueError(f"Unsupported file format: {file_format}")
+        
+        for chunk in chunks:
+            chunk = self._filter_dataframe(self._apply_table_schema(chunk, table_name), filters)
+            if columns:
+                chunk = chunk[[column for column in columns if column in chunk.columns]]
+            yield chunk
+    
+    def _aggregate_chunks(self, chunks: Iterable[pd.DataFrame], group_by: List[str],
+                          aggs: Dict[str, List[str]]) -> pd.DataFrame:
+        """流式分组聚合：每块计算局部的 sum/count/min/max 并与累计结果合并，均值最后由 sum/count 得出"""
+        partial_aggs = {}
+        for column, funcs in aggs.items():
+            for func in funcs:
+                for part in (("sum", "count") if func == "mean" else (func,)):
+                    partial_aggs[f"{column}__{part}"] = (column, part)
+        combine = {name: ("sum" if part in ("sum", "count") else part) for name, (_, part) in partial_aggs.items()}
+        keys = group_by or ["__all"]
+        
+        result = None
+        for chunk in chunks:
+            if not group_by:
+                chunk = chunk.assign(__all=0)
+            partial = chunk.groupby(keys, observed=True, sort=False).agg(**partial_aggs)
+            if result is not None:
+                partial = pd.concat([result, partial]).groupby(level=keys, sort=False).agg(combine)
+            result = partial
+        
+        if result is None:
+            return pd.DataFrame(columns=group_by + [f"{c}_{f}" for c, funcs in aggs.items() for f in funcs])
+        
+        output = pd.DataFrame(index=result.index)
+        for column, funcs in aggs.items():
+            for func in funcs:
+                if func == "mean":
+                    output[f"{column}_mean"] = result[f"{column}__sum"] / result[f"{column}__count"]
+                else:
+                    output[f"{column}_{func}"] = result[f"{column}__{func}"]
+        
+        if not group_by:
+            return output.reset_index(drop=True)
+        return output.sort_index().reset_index()
+    
+    def _iter_json_records(self, handle: BinaryIO, chunksize: int,
+                           wal_records: Optional[List[Any]] = None) -> Iterator[List[Any]]:
+        """逐行解析每行一条记录的JSON数组文件，最后输出WAL中的记录；其他格式的JSON文件整体解析后分块"""
+        with handle as f:
+            first = f.readline()
+            second = f.readline()
+            line_layout = first.strip() == b'['
+            if line_layout and second.strip() not in (b'', b']'):
+                try:
+                    json.loads(second.rstrip().rstrip(b','))
+                except ValueError:
+                    line_layout = False
+            
+            if line_layout:
+                records = []
+                f.seek(len(first))
+                for line in f:
+                    line = line.rstrip().rstrip(b',')
+                    if not line or line == b']':
+                        continue
+                    records.append(json.loads(line))
+                    if len(records) >= chunksize:
+                        yield records
+                        records = []
+                records.extend(wal_records or [])
+                for start in range(0, len(records), chunksize):
+                    yield records[start:start + chunksize]
+                return
+            
+            f.seek(0)
+            data = json.load(f)
+        
+        if isinstance(data, dict):
+            data = self._to_dataframe(data).to_dict('records')
+        else:
+            data = data + (wal_records or [])
+        for start in range(0, len(data), chunksize):
+            yield data[start:start + chunksize]
     
     def _delete_from_file(self, table_name: str) -> bool:
         """删除文件"""
-        for ext in ['.json', '.csv']:
-            filepath = os.path.join(self.data_dir, f"{table_name}{ext}")
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        with self._table_lock(table_name):
+            for ext in [f".{file_format}" for file_format in self.FILE_FORMATS]:
+                filepath = os.path.join(self.data_dir, f"{table_name}{ext}")
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            self._remove_wal(table_name)
+            self._drop_file_index(table_name)
+            self._drop_partitions(table_name)
         return True
     
+    def _ingest_to_parquet(self, chunks: Iterable[pd.DataFrame], table_name: str, if_exists: str) -> int:
+        """逐块写入Parquet文件（每个数据块写为一个行组）
+        
+        写入临时文件期间不持有排他锁，读取方不受影响；追加模式在替换时检查版本号，
+        期间已有其他写入时放弃本次写入，避免覆盖其他进程追加的数据。
+        """
+        if pq is None:
+            raise ImportError("pyarrow is required for parquet storage")
+        
+        filepath = os.path.join(self.data_dir, f"{table_name}.parquet")
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        rows = 0
+        writer = None
+        
+        # Parquet文件不支持原地追加：追加模式先把已有行组复制到新文件
+        version = self.get_table_version(table_name)
+        existing = pq.ParquetFile(filepath) if if_exists == "append" and os.path.exists(filepath) else None
+        
+        try:
+            if existing is not None:
+                writer = pq.ParquetWriter(tmp_path, existing.schema_arrow)
+                for i in range(existing.num_row_groups):
+                    writer.write_table(existing.read_row_group(i))
+            
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+            
+            if writer is not None:
+                writer.close()
+                with self._table_lock(table_name, expected_version=version if existing is not None else None):
+                    os.replace(tmp_path, filepath)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows
+    
+    def _ingest_to_feather(self, chunks: Iterable[pd.DataFrame], table_name: str, if_exists: str) -> int:
+        """逐块写入未压缩的Feather（Arrow IPC）文件，以便读取时内存映射、零拷贝
+        
+        与Parquet相同，追加模式在替换时检查版本号。
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for feather storage")
+        
+        filepath = os.path.join(self.data_dir, f"{table_name}.feather")
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        rows = 0
+        writer = None
+        version = self.get_table_version(table_name)
+        source = pa.memory_map(filepath, 'r') if if_exists == "append" and os.path.exists(filepath) else None
+        
+        try:
+            # Arrow IPC文件不支持原地追加：追加模式先复制已有记录批次（直接来自内存映射，不解码）
+            if source is not None:
+                reader = pa.ipc.open_file(source)
+                schema = reader.schema
+                writer = pa.ipc.new_file(tmp_path, schema)
+                for i in range(reader.num_record_batches):
+                    writer.write_batch(reader.get_batch(i))
+            
+            for chunk in chunks:
+                table = self._decode_dictionaries(pa.Table.from_pandas(chunk, preserve_index=False))
+                if writer is None:
+                    schema = table.schema
+                    writer = pa.ipc.new_file(tmp_path, schema)
+                else:
+                    table = table.cast(schema)
+                writer.write_table(table)
+                rows += len(chunk)
+            
+            if writer is not None:
+                writer.close()
+                if source is not None:
+                    source.close()
+                with self._table_lock(table_name, expected_version=version if source is not None else None):
+                    os.replace(tmp_path, filepath)
+        finally:
+            if writer is not None:
+                writer.close()
+            if source is not None:
+                source.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows
+    
+    def _decode_dictionaries(self, table: "pa.Table") -> "pa.Table":
+        """将字典编码（分类）列还原为普通列
+        
+        Arrow IPC文件要求同一列在所有记录批次中使用同一个字典，不同数据块的类别不一致时无法追加，
+        因此以普通列存储，读取时再按表结构转换为分类列。
+        """
+        fields = [
+            pa.field(field.name, field.type.value_type, field.nullable) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ]
+        if all(field.type == original.type for field, original in zip(fields, table.schema)):
+            return table
+        return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+    
+    def _ingest_to_csv(self, chunks: Iterable[pd.DataFrame], table_name: str, if_exists: str) -> int:
+        """逐块写入CSV文件
+        
+        覆盖模式先写入临时文件，有数据时再原子替换，空迭代器或中途出错都不影响已有文件；
+        追加模式在导入期间持有排他锁原地追加，出错时截回导入前的大小。
+        """
+        filepath = os.path.join(self.data_dir, f"{table_name}.csv")
+        rows = 0
+        
+        if if_exists == "replace":
+            tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                    for chunk in chunks:
+                        chunk.to_csv(f, index=False, header=f.tell() == 0)
+                        rows += len(chunk)
+                if os.path.getsize(tmp_path) > 0:
+                    with self._table_lock(table_name):
+                        self._replace_file(tmp_path, filepath)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return rows
+        
+        with self._table_lock(table_name):
+            write_header = not os.path.exists(filepath) or os.path.getsize(filepath) == 0
+            with open(filepath, 'a', encoding='utf-8', newline='') as f:
+                start = f.tell()
+                try:
+                    for chunk in chunks:
+                        chunk.to_csv(f, index=False, header=write_header)
+                        write_header = False
+                        rows += len(chunk)
+                except Exception:
+                    f.truncate(start)
+                    raise
+        
+        return rows
+    
     # 数据库存储方法
     def _init_database(self):
         """初始化数据库"""
@@ -227,18 +2240,78 @@ class DataStorage:
     
     @contextmanager
     def _get_db_connection(self):
-        """获取数据库连接"""
+        """获取当前线程的数据库连接（连接在线程内复用，不在每次调用后关闭）
+        
+        同一线程内可以嵌套使用（例如边读取 iter_data 边 bulk_ingest），只有最外层退出时才回滚未提交的事务。
+        """
         if self.db_url.startswith('sqlite'):
-            db_path = self.db_url.replace('sqlite:///', '')
-            conn = sqlite3.connect(db_path)
+            conn = self._get_pooled_connection()
+            self._local.depth += 1
             try:
                 yield conn
             finally:
-                conn.close()
+                self._local.depth -= 1
+                # 回滚未提交的事务，避免连接归还后继续持有写锁
+                if self._local.depth == 0 and conn.in_transaction:
+                    conn.rollback()
         else:
             # 可以添加其他数据库的连接逻辑
             raise NotImplementedError("Only SQLite is currently supported")
     
+    def _get_pooled_connection(self) -> sqlite3.Connection:
+        """获取或创建当前线程的SQLite连接"""
+        conn = getattr(self._local, 'connection', None)
+        # fork出的子进程不能复用父进程的连接
+        if conn is not None and self._local.pid == os.getpid() and self._local.generation == self._pool_generation:
+            return conn
+        
+        db_path = self.db_url.replace('sqlite:///', '')
+        # 连接只在创建它的线程内使用；关闭不受此限制，以便回收已退出线程的连接
+        conn = sqlite3.connect(db_path, timeout=DatabaseConfig.SQLITE_BUSY_TIMEOUT / 1000,
+                               check_same_thread=False)
+        
+        # WAL模式下读写互不阻塞，多个会话可以在写入的同时读取
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DatabaseConfig.SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DatabaseConfig.SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={DatabaseConfig.SQLITE_BUSY_TIMEOUT}")
+        
+        self._local.connection = conn
+        self._local.pid = os.getpid()
+        self._local.depth = 0
+        self._local.generation = self._pool_generation
+        with self._pool_lock:
+            # 每次有线程新建连接时回收已退出线程的连接，连接数不超过存活的线程数
+            stale = [entry for entry in self._connections if not entry[0].is_alive()]
+            self._connections = [entry for entry in self._connections if entry[0].is_alive()]
+            self._connections.append((threading.current_thread(), os.getpid(), conn))
+        self._close_connections(stale)
+        return conn
+    
+    def close(self):
+        """合并JSON表的WAL并关闭连接池中的所有连接"""
+        if self.use_json:
+            self.compact_wal()
+        
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+            self._pool_generation += 1
+        
+        self._close_connections(connections)
+        self._local = threading.local()
+    
+    def _close_connections(self, connections: List[tuple]):
+        """关闭连接池中的连接，fork前由父进程创建的连接不在子进程中关闭"""
+        for _, pid, conn in connections:
+            if pid != os.getpid():
+                continue
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Error closing SQLite connection: {str(e)}")
+    
     def _save_to_database(self, data: Union[Dict, pd.DataFrame], table_name: str) -> bool:
         """保存数据到数据库"""
         try:
@@ -248,16 +2321,179 @@ class DataStorage:
                 else:
                     df = pd.DataFrame(data)
                     df.to_sql(table_name, conn, if_exists='replace', index=False)
+                # 覆盖写入会重建表，数据写入后再建索引
+                self._ensure_database_indexes(conn, table_name)
+                conn.commit()
             return True
         except Exception as e:
             self.logger.error(f"Error saving to database: {str(e)}")
             return False
     
-    def _load_from_database(self, table_name: str) -> Optional[pd.DataFrame]:
+    def _ingest_to_database(self, chunks: Iterable[pd.DataFrame], table_name: str, if_exists: str) -> int:
+        """在单个事务内批量插入数据块
+        
+        删表和建表语句也在同一事务内执行（不经过 pandas.to_sql，它会自行提交），
+        数据块迭代器中途出错时整体回滚，原有数据保持不变。
+        """
+        rows = 0
+        with self._get_db_connection() as conn:
+            # 已处于调用方的事务中时由调用方提交或回滚
+            owns_transaction = not conn.in_transaction
+            try:
+                if owns_transaction:
+                    conn.execute("BEGIN")
+                insert_sql = None
+                for chunk in chunks:
+                    chunk = self._to_sql_values(chunk)
+                    if insert_sql is None:
+                        # 用第一个数据块的结构建表
+                        if if_exists == "replace":
+                            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                        conn.execute(self._create_table_sql(table_name, chunk, if_not_exists=True))
+                        columns = ", ".join(f'"{column}"' for column in chunk.columns)
+                        placeholders = ", ".join("?" for _ in chunk.columns)
+                        insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})'
+                    
+                    conn.executemany(insert_sql, chunk.itertuples(index=False, name=None))
+                    rows += len(chunk)
+                if insert_sql is not None:
+                    self._ensure_database_indexes(conn, table_name)
+                if owns_transaction:
+                    conn.commit()
+            except Exception:
+                if owns_transaction:
+                    conn.rollback()
+                raise
+        return rows
+    
+    def _to_sql_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        """将DataFrame转换为sqlite3可直接绑定的列类型"""
+        converted = {}
+        for column, dtype in df.dtypes.items():
+            if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                # 逐行取值时Arrow字符串列远慢于object列
+                converted[column] = df[column].astype(object)
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                converted[column] = self._sql_timestamps(df[column])
+            elif pd.api.types.is_bool_dtype(dtype):
+                converted[column] = df[column].astype(np.int64)
+            elif pd.api.types.is_float_dtype(dtype):
+                converted[column] = df[column].astype(np.float64)
+            elif pd.api.types.is_integer_dtype(dtype):
+                converted[column] = df[column].astype(np.int64)
+        
+        if not converted:
+            return df
+        return df.assign(**converted)
+    
+    def _sql_timestamps(self, values: pd.Series) -> pd.Series:
+        """将时间列转换为与 pandas.to_sql 相同的文本格式（datetime.isoformat(sep=' ')，微秒为0时省略小数部分）
+        
+        同一列中的取值无论经由哪条写入路径都保持同一格式，按文本比较的等值和范围条件才能正确匹配。
+        """
+        text = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+        fraction = values.dt.microsecond != 0
+        if fraction.any():
+            text = text.where(~fraction, values.dt.strftime('%Y-%m-%d %H:%M:%S.%f'))
+        return text
+    
+    def _sql_timestamp(self, value: pd.Timestamp) -> str:
+        """将查询条件中的时间转换为与 _sql_timestamps 相同的文本格式"""
+        return value.to_pydatetime().isoformat(sep=' ')
+    
+    def _upsert_to_database(self, data: Union[Dict, pd.DataFrame], table_name: str, key: List[str]) -> bool:
+        """按主键更新或插入记录（INSERT ... ON CONFLICT DO UPDATE）"""
+        df = self._to_sql_values(self._to_dataframe(data))
+        if df.empty:
+            return True
+        
+        columns = ", ".join(f'"{column}"' for column in df.columns)
+        placeholders = ", ".join("?" for _ in df.columns)
+        conflict = ", ".join(f'"{column}"' for column in key)
+        updates = ", ".join(f'"{column}" = excluded."{column}"' for column in df.columns if column not in key)
+        index_name = f"uq_{table_name}_{'_'.join(key)}"
+        
+        with self._get_db_connection() as conn:
+            try:
+                # 表不存在时按数据结构建表，并确保主键上有唯一索引
+                df.head(0).to_sql(table_name, conn, if_exists='append', index=False)
+                conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({conflict})')
+                self._ensure_database_indexes(conn, table_name)
+                
+                on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                conn.executemany(
+                    f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders}) '
+                    f'ON CONFLICT ({conflict}) {on_conflict}',
+                    df.itertuples(index=False, name=None)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return True
+    
+    def _database_columns(self, conn: sqlite3.Connection, table_name: str) -> set:
+        """获取表的列名"""
+        return {row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+    
+    def _database_indexes(self, conn: sqlite3.Connection, table_name: str) -> List[List[str]]:
+        """获取表上已有索引的列清单"""
+        indexes = []
+        for row in conn.execute(f'PRAGMA index_list("{table_name}")').fetchall():
+            columns = [info[2] for info in conn.execute(f'PRAGMA index_info("{row[1]}")')]
+            indexes.append(columns)
+        return indexes
+    
+    def _index_covers(self, indexes: List[List[str]], columns: Iterable[str]) -> bool:
+        """已有索引的前缀列是否正好是这组等值过滤列"""
+        columns = set(columns)
+        return any(set(index[:len(columns)]) == columns for index in indexes)
+    
+    def _create_database_index(self, conn: sqlite3.Connection, table_name: str, columns: List[str]):
+        """创建索引（已存在时跳过）"""
+        index_name = f"ix_{table_name}_{'_'.join(columns)}"
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+        self.logger.info(f"Created index {index_name}")
+    
+    def _ensure_database_indexes(self, conn: sqlite3.Connection, table_name: str):
+        """为表创建声明的单列索引"""
+        declared = self.table_indexes.get(table_name)
+        if not declared:
+            return
+        
+        table_columns = self._database_columns(conn, table_name)
+        existing = self._database_indexes(conn, table_name)
+        for column in declared:
+            if column in table_columns and not self._index_covers(existing, [column]):
+                self._create_database_index(conn, table_name, [column])
+    
+    def _record_query_pattern(self, conn: sqlite3.Connection, table_name: str, columns: Iterable[str]):
+        """记录查询的过滤列组合，达到阈值时自动建索引"""
+        pattern = tuple(sorted(columns))
+        patterns = self._query_patterns.setdefault(table_name, Counter())
+        patterns[pattern] += 1
+        
+        threshold = DatabaseConfig.SQLITE_AUTO_INDEX_THRESHOLD
+        if threshold and patterns[pattern] == threshold and set(pattern) <= self._database_columns(conn, table_name):
+            if not self._index_covers(self._database_indexes(conn, table_name), pattern):
+                # 调用方的事务未结束时不能提交，索引随该事务一起提交
+                in_transaction = conn.in_transaction
+                self._create_database_index(conn, table_name, list(pattern))
+                if not in_transaction:
+                    conn.commit()
+    
+    def _select_columns(self, columns: Optional[List[str]]) -> str:
+        """构建SELECT列清单"""
+        if not columns:
+            return "*"
+        return ", ".join(f'"{column}"' for column in columns)
+    
+    def _load_from_database(self, table_name: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
         """从数据库加载数据"""
         try:
             with self._get_db_connection() as conn:
-                query = f"SELECT * FROM {table_name}"
+                query = f"SELECT {self._select_columns(columns)} FROM {table_name}"
                 return pd.read_sql_query(query, conn)
         except Exception as e:
             self.logger.error(f"Error loading from database: {str(e)}")
@@ -273,35 +2509,79 @@ class DataStorage:
                     query = f"DELETE FROM {table_name} WHERE {where_clause}"
                     conn.execute(query, list(condition.values()))
                 else:
-                    # 删除整个表
+                    # 删除整个表（包括分区表）
                     query = f"DROP TABLE IF EXISTS {table_name}"
                     conn.execute(query)
+                    for partition in self._list_database_partitions(table_name):
+                        conn.execute(f'DROP TABLE IF EXISTS "{partition}"')
                 conn.commit()
             return True
         except Exception as e:
             self.logger.error(f"Error deleting from database: {str(e)}")
             return False
     
-    def _query_from_database(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+    def _build_select(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                      columns: Optional[List[str]] = None) -> tuple:
+        """构建带过滤条件的SELECT语句及参数"""
+        query = f"SELECT {self._select_columns(columns)} FROM {table_name}"
+        params = []
+        
+        if filters:
+            conditions = []
+            for k, v in filters.items():
+                if self._is_value_list(v):
+                    conditions.append(f"{k} IN ({', '.join('?' for _ in v)})")
+                    params.extend(v)
+                else:
+                    conditions.append(f"{k} = ?")
+                    params.append(v)
+            query += f" WHERE {' AND '.join(conditions)}"
+        
+        if limit:
+            query += f" LIMIT {limit}"
+        return query, params
+    
+    def _query_from_database(self, table_name: str, filters: Optional[Dict] = None, limit: Optional[int] = None,
+                             columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
         """从数据库查询数据"""
         try:
             with self._get_db_connection() as conn:
-                query = f"SELECT * FROM {table_name}"
-                params = []
-                
                 if filters:
-                    where_clause = " AND ".join([f"{k} = ?" for k in filters.keys()])
-                    query += f" WHERE {where_clause}"
-                    params.extend(filters.values())
-                
-                if limit:
-                    query += f" LIMIT {limit}"
-                
+                    self._record_query_pattern(conn, table_name, filters.keys())
+                query, params = self._build_select(table_name, filters, limit, columns)
                 return pd.read_sql_query(query, conn, params=params if params else None)
         except Exception as e:
             self.logger.error(f"Error querying database: {str(e)}")
             return None
     
+    def _aggregate_in_database(self, table_name: str, group_by: List[str], aggs: Dict[str, List[str]],
+                               filters: Optional[Dict] = None) -> pd.DataFrame:
+        """编译为 SQL GROUP BY 在数据库中聚合"""
+        select = [f'"{column}"' for column in group_by]
+        for column, funcs in aggs.items():
+            for func in funcs:
+                select.append(f'{self.AGG_FUNCTIONS[func]}("{column}") AS "{column}_{func}"')
+        
+        query, params = self._build_select(table_name, filters)
+        query = query.replace("SELECT *", f"SELECT {', '.join(select)}", 1)
+        if group_by:
+            group_list = ", ".join(f'"{column}"' for column in group_by)
+            query += f" GROUP BY {group_list} ORDER BY {group_list}"
+        
+        with self._get_db_connection() as conn:
+            if filters:
+                self._record_query_pattern(conn, table_name, filters.keys())
+            return pd.read_sql_query(query, conn, params=params if params else None)
+    
+    def _iter_from_database(self, table_name: str, chunksize: int, filters: Optional[Dict] = None,
+                            columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """通过游标分块读取数据库查询结果"""
+        with self._get_db_connection() as conn:
+            if filters:
+                self._record_query_pattern(conn, table_name, filters.keys())
+            query, params = self._build_select(table_name, filters, columns=columns)
+            yield from pd.read_sql_query(query, conn, params=params if params else None, chunksize=chunksize)
+    
     def _list_database_tables(self) -> List[str]:
         """列出数据库中的所有表"""
         try:
@@ -316,6 +2596,15 @@ class DataStorage:
             self.logger.error(f"Error listing database tables: {str(e)}")
             return []
     
+    def _list_database_partitions(self, table_name: str) -> List[str]:
+        """列出数据库中表的分区表"""
+        with self._get_db_connection() as conn:
+            cursor = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ? ESCAPE '\\'",
+                (table_name.replace('_', '\\_') + '\\_\\_p%',)
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+    
     def get_storage_info(self) -> Dict[str, Any]:
         """获取存储信息"""
         info = {
@@ -326,6 +2615,16 @@ class DataStorage:
             "tables": self.list_tables()
         }
         
+        with self._cache_lock:
+            lookups = self._cache_stats["hits"] + self._cache_stats["misses"]
+            info["table_cache"] = dict(
+                self._cache_stats,
+                entries=len(self._table_cache),
+                size_bytes=self._cache_bytes,
+                max_bytes=self.cache_max_bytes,
+                hit_rate=round(self._cache_stats["hits"] / lookups, 3) if lookups else 0.0
+            )
+        
         if self.use_json:
             # 计算存储大小
             total_size = 0
@@ -3,8 +3,10 @@
 from .helpers import *
 from .decorators import *
 from .i18n import get_text, set_language
+from .file_lock import FileLock, VersionConflictError, write_json_atomic
 
 __all__ = [
     'safe_data_operation', 'export_data', 'cached_operation',
-    'get_text', 'set_language', 'rate_limit_decorator'
+    'get_text', 'set_language', 'rate_limit_decorator',
+    'FileLock', 'VersionConflictError', 'write_json_atomic'
 ]
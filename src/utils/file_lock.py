@@ -0,0 +1,145 @@
+"""
+跨进程文件读写锁
+"""
+
+import os
+import json
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台没有fcntl，退化为只在进程内有效的锁
+    fcntl = None
+
+
+class VersionConflictError(RuntimeError):
+    """乐观版本检查失败：读取之后文件已被其他进程或线程修改"""
+
+
+class FileLock:
+    """基于 fcntl.flock 的读写锁，锁文件中同时保存被保护数据的版本号
+    
+    读取时持有共享锁，多个进程和线程可以同时读取；写入时持有排他锁，每次排他锁释放前版本号加一。
+    调用方可以在读取时记下版本号，写入时通过 expected_version 检查期间是否有其他写入（乐观并发控制），
+    不必在整个读-改-写过程中持有排他锁。
+    同一线程内可重入：已持有排他锁时可以再获取共享锁或排他锁，但不能从共享锁升级为排他锁。
+    """
+    
+    VERSION_FORMAT = "<Q"
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 锁文件路径，不存在时自动创建
+        """
+        self.path = path
+        self._local = threading.local()
+        self._fallback = threading.RLock() if fcntl is None else None
+    
+    @contextmanager
+    def shared(self) -> Iterator[int]:
+        """持有共享锁，返回当前版本号"""
+        with self._acquire(exclusive=False) as fd:
+            yield self._read_version(fd)
+    
+    @contextmanager
+    def exclusive(self, expected_version: Optional[int] = None) -> Iterator[int]:
+        """持有排他锁，返回当前版本号
+        
+        Args:
+            expected_version: 期望的版本号，与当前版本号不一致时抛出 VersionConflictError
+        """
+        with self._acquire(exclusive=True, expected_version=expected_version) as fd:
+            yield self._read_version(fd)
+    
+    def version(self) -> int:
+        """读取当前版本号（不加锁）"""
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            return self._read_version(state['fd'])
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(struct.calcsize(self.VERSION_FORMAT))
+        except FileNotFoundError:
+            return 0
+        return self._unpack_version(data)
+    
+    @contextmanager
+    def _acquire(self, exclusive: bool, expected_version: Optional[int] = None) -> Iterator[int]:
+        """获取锁；flock 作用于打开的文件描述，每次获取单独打开锁文件，同一进程的不同线程之间也互斥"""
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            if exclusive and not state['exclusive']:
+                raise RuntimeError(f"Cannot upgrade shared lock on {self.path} to exclusive")
+            self._check_version(state['fd'], expected_version)
+            state['depth'] += 1
+            try:
+                yield state['fd']
+            finally:
+                state['depth'] -= 1
+            return
+        
+        if self._fallback is not None:
+            self._fallback.acquire()
+        try:
+            fd = self._open()
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                # 版本检查失败时没有写入，不递增版本号
+                self._check_version(fd, expected_version)
+                self._local.state = {'fd': fd, 'exclusive': exclusive, 'depth': 1}
+                try:
+                    yield fd
+                finally:
+                    self._local.state = None
+                    if exclusive:
+                        os.pwrite(fd, struct.pack(self.VERSION_FORMAT, self._read_version(fd) + 1), 0)
+            finally:
+                # 关闭文件描述即释放锁
+                os.close(fd)
+        finally:
+            if self._fallback is not None:
+                self._fallback.release()
+    
+    def _check_version(self, fd: int, expected_version: Optional[int]):
+        """检查当前版本号是否与期望一致"""
+        if expected_version is None:
+            return
+        version = self._read_version(fd)
+        if version != expected_version:
+            raise VersionConflictError(f"{self.path} changed since version {expected_version} (now {version})")
+    
+    def _open(self) -> int:
+        """打开（必要时创建）锁文件"""
+        try:
+            return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+    
+    def _read_version(self, fd: int) -> int:
+        """从锁文件读取版本号"""
+        return self._unpack_version(os.pread(fd, struct.calcsize(self.VERSION_FORMAT), 0))
+    
+    def _unpack_version(self, data: bytes) -> int:
+        """解析版本号，新建的空锁文件版本号为0"""
+        if len(data) < struct.calcsize(self.VERSION_FORMAT):
+            return 0
+        return struct.unpack(self.VERSION_FORMAT, data)[0]
+
+
+def write_json_atomic(path: str, data: Any):
+    """先写入同目录下的临时文件再原子替换，读取方不会看到写了一半的JSON文件"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)